@@ -2,22 +2,53 @@
 Backtest Scanner for Premarket Strategy
 Uses shared StrategyLogic to ensure consistency with live trading.
 """
+import heapq
+import os
+import pickle
 import time
-from datetime import datetime, timedelta
-from typing import List, Dict, Optional, Tuple
-from dataclasses import dataclass, field
+from operator import itemgetter
+from datetime import date, datetime, time as dt_time, timedelta, timezone
+from typing import List, Optional, Tuple
 import numpy as np
-from conditions import MarketData, Bar, StrategyLogic
+from conditions import MarketData, Bar, StrategyLogic, RollingMedian, BARS_1S_CAP, BARS_5S_CAP
 import strategy_config as config
 
+_NS_PER_SEC = 1_000_000_000
+
+# End of the replayed premarket session (ET)
+_SESSION_END = dt_time(8, 30)
+
+# Session dates are US/Eastern; without a tz database fall back to EST, which never runs ahead of ET
+try:
+    from zoneinfo import ZoneInfo
+    _ET = ZoneInfo("America/New_York")
+except Exception:
+    _ET = timezone(timedelta(hours=-5))
+
+def calculate_commission(entry_price: float, exit_price: float, shares: int) -> float:
+    """Round-trip IBKR commission: per-share above $1, percent of value below."""
+    if entry_price >= 1.0:
+        return 2 * max(config.COMMISSION_MIN, shares * config.COMMISSION_PER_SHARE)
+    return (entry_price + exit_price) * shares * config.COMMISSION_PERCENT_LOW
+
+def _cache_path(symbol: str, date_str: str) -> Optional[str]:
+    """On-disk cache file for a symbol's raw bars, or None if the day may still change."""
+    if not config.BACKTEST_CACHE_DIR or date.fromisoformat(date_str) >= datetime.now(_ET).date():
+        return None
+    name = f"{symbol}_{date_str}_{config.BACKTEST_1S_WHAT_TO_SHOW}.pkl"
+    return os.path.join(config.BACKTEST_CACHE_DIR, name)
+
 class BacktestEngine:
     def __init__(self, symbol: str, initial_capital: float = 10000.0):
         self.symbol = symbol
         self.capital = initial_capital
         self.market_data = MarketData(symbol=symbol, timestamp=datetime.now(), price=0.0)
+        # Medians over the MarketData bar windows, updated per bar instead of re-sorted
+        self.med_vol_1s = RollingMedian(BARS_1S_CAP)
+        self.med_vol_5s = RollingMedian(BARS_5S_CAP)
+        self.med_range_5s = RollingMedian(BARS_5S_CAP)
         
-        # History for backtest
-        self.full_history: List[Bar] = []
+        # Results for backtest
         self.trades = []
         
         # State
@@ -27,75 +58,90 @@ class BacktestEngine:
         self.entry_time = None
         self.R = 0.0
         self.shares = 0
-        self.arm_time = None
+        self.arm_ns = 0
+        self.bar_ns = 0
 
     def load_tws_data(self, tws_app, date_str: str) -> Tuple[List[Bar], List[Bar]]:
-        """Fetch 1s and 5s bars from TWS for a specific date."""
+        """Load 1s and 5s bars for a specific date, from the local cache when possible."""
+        path = _cache_path(self.symbol, date_str)
+        if path and os.path.exists(path):
+            with open(path, 'rb') as f:
+                bars_1s_raw, bars_5s_raw = pickle.load(f)
+            print(f"[BACKTEST] Loaded cached bars for {self.symbol} on {date_str} (1s: {len(bars_1s_raw)}, 5s: {len(bars_5s_raw)})")
+        else:
+            bars_1s_raw, bars_5s_raw, complete = self._fetch_tws_raw(tws_app, date_str)
+            # Only complete past sessions are cached; a partial or empty fetch is retried next run
+            if path and not complete:
+                print(f"[BACKTEST] {self.symbol} on {date_str}: incomplete fetch, not cached")
+            elif path and bars_1s_raw and bars_5s_raw:
+                os.makedirs(config.BACKTEST_CACHE_DIR, exist_ok=True)
+                tmp = path + ".tmp"
+                with open(tmp, 'wb') as f:
+                    pickle.dump((bars_1s_raw, bars_5s_raw), f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp, path)
+        
+        return [Bar.from_dict(b) for b in bars_1s_raw], [Bar.from_dict(b) for b in bars_5s_raw]
+
+    def _fetch_tws_raw(self, tws_app, date_str: str) -> Tuple[List[dict], List[dict], bool]:
+        """Fetch raw 1s and 5s bar dicts from TWS for a specific date.
+
+        The flag is True only if every request (5s and all three 1s chunks) returned data and finished.
+        """
         # TWS expects "YYYYMMDD HH:MM:SS"
-        target_date = datetime.strptime(date_str, "%Y-%m-%d")
-        # Use 9:30 AM to align with the end of premarket
-        end_dt = target_date.replace(hour=8, minute=30, second=0)
+        end_dt = datetime.combine(date.fromisoformat(date_str), _SESSION_END)
         
         # Use exact format from Scanner-Alert: "1 D" and "YYYYMMDD HH:MM:SS US/Eastern"
         print(f"[BACKTEST] Requesting 5s bars for {self.symbol} on {date_str}...")
-        bars_5s_raw = tws_app.fetch_historical_bars(self.symbol, end_dt, duration="1 D", bar_size="5 secs")
-        print(f"[DEBUG] {self.symbol} 5s bars received: {len(bars_5s_raw)}")
+        bars_5s_raw, complete = tws_app.fetch_historical_bars_checked(self.symbol, end_dt, duration="1 D", bar_size="5 secs")
+        print(f"[DEBUG] {self.symbol} 5s bars received: {len(bars_5s_raw)}{'' if complete else ' (timed out)'}")
         
         print(f"[BACKTEST] Requesting 1s bars for {self.symbol} on {date_str} (Multi-chunk)...")
         # 1s bars are limited to 1800-3600 seconds per request.
         # We fetch three 30-minute chunks to cover the most active premarket (08:00 - 09:30)
-        bars_1s_raw = []
+        chunks_1s = []
         for i in range(3):
             chunk_end = end_dt - timedelta(seconds=i * 1800)
             print(f"  > Fetching 1s chunk {i+1}/3 ending at {chunk_end.strftime('%H:%M:%S')}...")
             try:
-                chunk_data = tws_app.fetch_historical_bars(
+                chunk_data, chunk_complete = tws_app.fetch_historical_bars_checked(
                     self.symbol,
                     chunk_end,
                     duration="1800 S",
                     bar_size="1 secs",
                     what_to_show=config.BACKTEST_1S_WHAT_TO_SHOW
                 )
+                if not chunk_complete:
+                    complete = False
                 if chunk_data and len(chunk_data) > 0:
-                    bars_1s_raw.extend(chunk_data)
-                    print(f"     Got {len(chunk_data)} bars")
+                    chunks_1s.append(chunk_data)
+                    print(f"     Got {len(chunk_data)} bars{'' if chunk_complete else ' (timed out)'}")
                 else:
+                    complete = False
                     print(f"     No data returned (empty or None)")
             except Exception as e:
+                complete = False
                 print(f"     Error fetching chunk: {e}")
                 continue
             # Small sleep to avoid pacing violations
             time.sleep(0.5)
         
-        # Sort and remove duplicates if any
-        bars_1s_raw.sort(key=lambda x: x['date'])
-        unique_bars = []
+        # Each chunk is already sorted: merge them and drop duplicates at the seams.
+        # The fixed-width date strings order lexicographically = chronologically.
+        bars_1s_raw = []
         last_date = None
-        for b in bars_1s_raw:
+        for b in heapq.merge(*chunks_1s, key=itemgetter('date')):
             if b['date'] != last_date:
-                unique_bars.append(b)
+                bars_1s_raw.append(b)
                 last_date = b['date']
-        bars_1s_raw = unique_bars
         print(f"[DEBUG] {self.symbol} 1s bars received (total): {len(bars_1s_raw)}")
         
-        def convert_bars(raw_list):
-            converted = []
-            for b in raw_list:
-                # b['date'] format: '20260129  07:00:00'
-                ts = datetime.strptime(b['date'], "%Y%m%d  %H:%M:%S")
-                converted.append(Bar(ts, b['open'], b['high'], b['low'], b['close'], b['volume'], b['average']))
-            return converted
-
-        return convert_bars(bars_1s_raw), convert_bars(bars_5s_raw)
+        return bars_1s_raw, bars_5s_raw, complete
 
-    def add_bar_1s(self, bar: Bar):
+    def add_bar_1s(self, bar: Bar, in_window: bool = True):
         self.market_data.timestamp = bar.timestamp
+        self.bar_ns = bar.ts_ns
         self.market_data.price = bar.close
         self.market_data.bars_1s.append(bar)
-        
-        # Maintain 1s window for medians
-        if len(self.market_data.bars_1s) > 300:
-            self.market_data.bars_1s.pop(0)
             
         # Mock bid/ask for backtest (0.01 spread)
         self.market_data.bid = bar.close - 0.005
@@ -104,20 +150,22 @@ class BacktestEngine:
         self.market_data.ask_time = bar.timestamp
         
         # Update medians
-        mv1, _, _ = StrategyLogic.calculate_medians(self.market_data.bars_1s, 120)
-        self.market_data.med_vol_1s = mv1
+        self.med_vol_1s.push(bar.volume)
+        self.market_data.med_vol_1s = max(1.0, self.med_vol_1s.median())
         
+        # An idle engine outside the trading windows has nothing to evaluate
+        if self.state == "IDLE" and not in_window:
+            return
         self._process_logic()
 
     def add_bar_5s(self, bar: Bar):
         self.market_data.bars_5s.append(bar)
-        if len(self.market_data.bars_5s) > 120:
-            self.market_data.bars_5s.pop(0)
             
         # Update medians
-        mv5, mr5, _ = StrategyLogic.calculate_medians(self.market_data.bars_5s, 120)
-        self.market_data.med_vol_5s = mv5
-        self.market_data.med_range_5s = mr5
+        self.med_vol_5s.push(bar.volume)
+        self.med_range_5s.push(bar.high - bar.low)
+        self.market_data.med_vol_5s = max(1.0, self.med_vol_5s.median())
+        self.market_data.med_range_5s = max(0.001, self.med_range_5s.median())
 
     def _process_logic(self):
         ts_str = self.market_data.timestamp.strftime("%H:%M:%S")
@@ -128,30 +176,31 @@ class BacktestEngine:
                     last_5s = self.market_data.bars_5s[-1]
                     # Simulate a 1s bar from the 5s bar for the detector
                     mock_1s = Bar(last_5s.timestamp, last_5s.open, last_5s.high, last_5s.low, last_5s.close, last_5s.volume // 5)
-                    self.market_data.bars_1s = [mock_1s]
+                    self.market_data.bars_1s.append(mock_1s)
                 
                 # Debug print for specified time window
-                if config.DEBUG_TIME_WINDOW and ts_str.startswith(config.DEBUG_TIME_WINDOW):
+                debug = bool(config.DEBUG_TIME_WINDOW) and ts_str.startswith(config.DEBUG_TIME_WINDOW)
+                if debug:
                     if self.market_data.bars_1s:
                         last_1s = self.market_data.bars_1s[-1]
                         ret_1s = (last_1s.close - last_1s.open) / last_1s.open if last_1s.open != 0 else 0
                         print(f"[DEBUG-{config.DEBUG_TIME_WINDOW}] {ts_str} | 1s bar: O={last_1s.open:.4f} H={last_1s.high:.4f} L={last_1s.low:.4f} C={last_1s.close:.4f} V={last_1s.volume:.0f} | Ret={ret_1s:.2%} | Med_Vol={self.market_data.med_vol_1s:.0f} | Threshold={config.SHOCK_RET_1S:.2%}, {config.SHOCK_VOL_MULT_1S}x")
                 
-                shock_ok, reason = StrategyLogic.check_shock_1s(self.market_data)
+                shock_ok, reason = StrategyLogic.check_shock_1s(self.market_data, verbose=debug)
                 
                 # Also print shock check result for specified time window
-                if config.DEBUG_TIME_WINDOW and ts_str.startswith(config.DEBUG_TIME_WINDOW):
+                if debug:
                     print(f"[DEBUG-{config.DEBUG_TIME_WINDOW}] {ts_str} | Shock Check: {shock_ok} | {reason}")
                 
                 if shock_ok:
                     print(f"[DEBUG] {ts_str} {self.symbol} IDLE -> ARMED. Reason: {reason}")
                     self.state = "ARMED"
-                    self.arm_time = self.market_data.timestamp
+                    self.arm_ns = self.bar_ns
 
         elif self.state == "ARMED":
-            elapsed = (self.market_data.timestamp - self.arm_time).total_seconds()
-            if elapsed > config.ARM_TIMEOUT_SECONDS:
-                print(f"[DEBUG] {ts_str} {self.symbol} ARMED -> IDLE (Timeout {elapsed}s)")
+            elapsed_ns = self.bar_ns - self.arm_ns
+            if elapsed_ns > config.ARM_TIMEOUT_SECONDS * _NS_PER_SEC:
+                print(f"[DEBUG] {ts_str} {self.symbol} ARMED -> IDLE (Timeout {elapsed_ns / _NS_PER_SEC}s)")
                 self.state = "IDLE"
                 return
 
@@ -182,15 +231,7 @@ class BacktestEngine:
                 gross_pnl = (exit_price - self.entry_price) * self.shares
                 investment = self.entry_price * self.shares
                 
-                # Calculate commissions
-                if self.entry_price >= 1.0:
-                    entry_commission = max(config.COMMISSION_MIN, self.shares * config.COMMISSION_PER_SHARE)
-                    exit_commission = max(config.COMMISSION_MIN, self.shares * config.COMMISSION_PER_SHARE)
-                else:
-                    entry_commission = investment * config.COMMISSION_PERCENT_LOW
-                    exit_commission = (exit_price * self.shares) * config.COMMISSION_PERCENT_LOW
-                
-                total_commission = entry_commission + exit_commission
+                total_commission = calculate_commission(self.entry_price, exit_price, self.shares)
                 net_pnl = gross_pnl - total_commission
                 pnl_pct = (net_pnl / investment * 100) if investment > 0 else 0
                 
@@ -213,18 +254,22 @@ class BacktestEngine:
 
 def run_backtest(symbol: str, bars_1s: List[Bar], bars_5s: List[Bar]):
     engine = BacktestEngine(symbol)
+    ts_1s = np.array([b.timestamp for b in bars_1s], dtype='datetime64[s]')
+    in_window = StrategyLogic.is_in_window_vec(ts_1s).tolist()
     
-    # We need to feed 1s and 5s bars in chronological order
-    # For simplicity in this backtest script, we align them by timestamp
-    all_events = []
-    for b in bars_1s: all_events.append((b.timestamp, '1s', b))
-    for b in bars_5s: all_events.append((b.timestamp, '5s', b))
-    all_events.sort(key=lambda x: x[0])
+    # We need to feed 1s and 5s bars in chronological order.
+    # Both streams arrive sorted from TWS, so merge them lazily instead of
+    # sorting a combined list; on equal timestamps the 1s bar goes first.
+    events_1s = ((b.timestamp, '1s', b, iw) for b, iw in zip(bars_1s, in_window))
+    events_5s = ((b.timestamp, '5s', b, None) for b in bars_5s)
     
-    for ts, type, bar in all_events:
+    # Bind the per-bar entry points once; the loop runs for every bar of the session
+    add_bar_1s = engine.add_bar_1s
+    add_bar_5s = engine.add_bar_5s
+    for ts, type, bar, iw in heapq.merge(events_1s, events_5s, key=itemgetter(0)):
         if type == '1s':
-            engine.add_bar_1s(bar)
+            add_bar_1s(bar, iw)
         else:
-            engine.add_bar_5s(bar)
+            add_bar_5s(bar)
             
     return engine.trades, engine.capital
@@ -3,11 +3,100 @@ Premarket Shock & Confirm Momentum Strategy - Core Logic
 Shared between realtime and backtest paths.
 """
 import math
-from datetime import datetime, time as dt_time
+from bisect import bisect_left, insort
+from collections import deque
+from datetime import datetime, time as dt_time, timedelta
+from typing import Optional, Tuple
+import numpy as np
 import strategy_config as config
 
+def _hms_to_seconds(hms: str) -> int:
+    h, m, s = hms.split(":")
+    return int(h) * 3600 + int(m) * 60 + int(s)
+
+def _median_select(values: np.ndarray) -> float:
+    """Median via np.partition (O(n) selection, no full sort); partitions in place."""
+    mid = len(values) // 2
+    if len(values) % 2:
+        return float(np.partition(values, mid)[mid])
+    part = np.partition(values, (mid - 1, mid))
+    return (float(part[mid - 1]) + float(part[mid])) / 2.0
+
+def window_seconds(windows):
+    """Convert ("HH:MM:SS", "HH:MM:SS") windows to inclusive seconds-of-day bounds."""
+    return [(_hms_to_seconds(start), _hms_to_seconds(end)) for start, end in windows]
+
+_EPOCH = datetime(1970, 1, 1)
+_ONE_US = timedelta(microseconds=1)
+
+def to_ns(dt: datetime) -> int:
+    """Naive datetime -> integer nanoseconds since the epoch (exact, no float rounding)."""
+    return (dt - _EPOCH) // _ONE_US * 1000
+
+def refresh_config():
+    """Snapshot strategy_config thresholds into module globals used by the checks.
+
+    Runs at import; call again after editing strategy_config at runtime.
+    """
+    global _WINDOWS_SEC, _WINDOW_EDGES, _MINUTE_MAP, _BYPASS_TIME_WINDOW, _BYPASS_VWAP_CHECK
+    global _SHOCK_RET_1S, _SHOCK_VOL_MULT_1S, _SHOCK_RET_2S, _SHOCK_VOL_MULT_2S
+    global _CONFIRM_RET_5S, _CONFIRM_VOL_MULT_5S, _RANGE_MULT_5S, _NO_FADE_FRAC
+    global _MAX_SPREAD_FRAC, _SPREAD_REL_MULT
+    global _FAIL_RET_1S, _TP_R_MULT, _TIME_STOP, _MIN_PNL_AT_TIME
+
+    # Premarket windows as seconds-of-day
+    _WINDOWS_SEC = window_seconds(config.PREMARKET_WINDOWS)
+    # Merged windows flattened to sorted half-open edges [s0, e0+1, s1, e1+1, ...]:
+    # a second is inside a window iff an odd number of edges are <= it
+    merged = []
+    for start, end in sorted(_WINDOWS_SEC):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    _WINDOW_EDGES = np.array([x for start, end in merged for x in (start, end + 1)], dtype=np.int64)
+    # Per minute-of-day: 0 = outside all windows, 1 = fully inside one,
+    # 2 = a window edge falls in this minute (resolve to the second)
+    _MINUTE_MAP = bytearray(1440)
+    for m in range(1440):
+        lo, hi = m * 60, m * 60 + 59
+        if any(start <= lo and hi <= end for start, end in _WINDOWS_SEC):
+            _MINUTE_MAP[m] = 1
+        elif any(start <= hi and lo <= end for start, end in _WINDOWS_SEC):
+            _MINUTE_MAP[m] = 2
+    _BYPASS_TIME_WINDOW = getattr(config, 'BYPASS_TIME_WINDOW', False)
+    _BYPASS_VWAP_CHECK = getattr(config, 'BYPASS_VWAP_CHECK', False)
+
+    _SHOCK_RET_1S = float(config.SHOCK_RET_1S)
+    _SHOCK_VOL_MULT_1S = float(config.SHOCK_VOL_MULT_1S)
+    _SHOCK_RET_2S = float(config.SHOCK_RET_2S)
+    _SHOCK_VOL_MULT_2S = float(config.SHOCK_VOL_MULT_2S)
+    _CONFIRM_RET_5S = float(config.CONFIRM_RET_5S)
+    _CONFIRM_VOL_MULT_5S = float(config.CONFIRM_VOL_MULT_5S)
+    _RANGE_MULT_5S = float(config.RANGE_MULT_5S)
+    _NO_FADE_FRAC = float(config.NO_FADE_FRAC)
+    _MAX_SPREAD_FRAC = config.MAX_SPREAD_PCT / 100.0
+    _SPREAD_REL_MULT = float(config.SPREAD_REL_MULT)
+    _FAIL_RET_1S = float(config.FAIL_RET_1S)
+    _TP_R_MULT = float(config.TP_R_MULT)
+    _TIME_STOP = timedelta(seconds=config.TIME_STOP_SECONDS)
+    _MIN_PNL_AT_TIME = float(config.MIN_PNL_AT_TIME)
+
+refresh_config()
+
+def parse_bar_date(s: str) -> datetime:
+    """Parse a TWS bar date ('20260129  07:00:00') by slicing, avoiding strptime."""
+    d, t = s.split()[:2]
+    return datetime(int(d[0:4]), int(d[4:6]), int(d[6:8]), int(t[0:2]), int(t[3:5]), int(t[6:8]))
+
+# History kept per symbol (bars)
+BARS_1S_CAP = 300
+BARS_5S_CAP = 120
+
 class Bar:
     """Simple Bar class to handle both object and dict style access."""
+    __slots__ = ('date', 'open', 'high', 'low', 'close', 'volume', 'average', 'ts_ns')
+
     def __init__(self, date, open, high, low, close, volume, average=0.0):
         self.date = date
         self.open = open
@@ -16,9 +105,26 @@ class Bar:
         self.close = close
         self.volume = volume
         self.average = average
+        self.ts_ns = to_ns(date) if isinstance(date, datetime) else 0
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "Bar":
+        """Build a Bar from a TWS historical bar dict, parsing string dates."""
+        date = d['date']
+        if isinstance(date, str):
+            date = parse_bar_date(date)
+        return cls(date, d['open'], d['high'], d['low'], d['close'], d['volume'], d.get('average', 0.0))
+
+    @property
+    def timestamp(self):
+        """Alias for `date`; the backtest path refers to bars by timestamp."""
+        return self.date
 
 class MarketData:
     """Container for symbol-specific market data and bar history."""
+    __slots__ = ('symbol', 'price', 'timestamp', 'vwap', 'bid', 'ask', 'bid_time', 'ask_time',
+                 'volume', 'bars_1s', 'bars_5s', 'med_vol_1s', 'med_vol_5s', 'med_range_5s')
+
     def __init__(self, symbol, price=0.0, timestamp=None):
         self.symbol = symbol
         self.price = price
@@ -26,13 +132,71 @@ class MarketData:
         self.vwap = 0.0
         self.bid = 0.0
         self.ask = 0.0
+        self.bid_time = None
+        self.ask_time = None
         self.volume = 0
-        self.bars_1s = [] 
-        self.bars_5s = []
+        # Fixed-capacity windows: the checks only read the latest bars, and
+        # the medians never look further back than these
+        self.bars_1s = deque(maxlen=BARS_1S_CAP)
+        self.bars_5s = deque(maxlen=BARS_5S_CAP)
         self.med_vol_1s = 0.0
         self.med_vol_5s = 0.0
         self.med_range_5s = 0.0
 
+class RollingMedian:
+    """Median over the last `size` samples, maintained incrementally."""
+    def __init__(self, size: int):
+        self.size = size
+        self.window = deque()
+        self.sorted_vals = []
+
+    def __len__(self):
+        return len(self.window)
+
+    def push(self, x):
+        """Add a sample, evicting the oldest once the window is full."""
+        if len(self.window) == self.size:
+            old = self.window.popleft()
+            del self.sorted_vals[bisect_left(self.sorted_vals, old)]
+        self.window.append(x)
+        insort(self.sorted_vals, x)
+
+    def median(self, default=0.0):
+        n = len(self.sorted_vals)
+        if n == 0: return default
+        mid = n // 2
+        if n % 2: return self.sorted_vals[mid]
+        return (self.sorted_vals[mid-1] + self.sorted_vals[mid]) / 2.0
+
+# Entry gates shared by the granular checks and evaluate_entry; callers pass hoisted bar fields
+def _confirm_5s(data: "MarketData", last_5s: "Bar") -> Tuple[bool, float, float]:
+    """Continuation confirm on a 5s bar with open != 0; returns (passed, ret_5s, range_5s)."""
+    ret_5s = (last_5s.close - last_5s.open) / last_5s.open
+    range_5s = last_5s.high - last_5s.low
+    is_confirm = (ret_5s >= _CONFIRM_RET_5S and 
+                  last_5s.volume >= _CONFIRM_VOL_MULT_5S * data.med_vol_5s and
+                  range_5s >= _RANGE_MULT_5S * data.med_range_5s)
+    # VWAP requirement bypass for testing or specific rules
+    if not _BYPASS_VWAP_CHECK and data.price < 1.05 * data.vwap:
+        is_confirm = False
+    return is_confirm, ret_5s, range_5s
+
+def _exec_safety(bid: float, ask: float, ret_5s_abs: float) -> Optional[str]:
+    """Spread checks; the failure reason, or None if execution is safe (ret_5s_abs 0 skips the relative check)."""
+    if bid == 0 or ask == 0:
+        return "No bid/ask"
+    spread_pct = (ask - bid) / bid
+    if spread_pct > _MAX_SPREAD_FRAC:
+        return f"Spread too wide: {spread_pct:.2%}"
+    # Spread relative to move magnitude
+    if ret_5s_abs > 0 and spread_pct > _SPREAD_REL_MULT * ret_5s_abs:
+        return f"Spread too wide rel to move: {spread_pct:.2%} vs {ret_5s_abs:.2%}"
+    return None
+
+def _holds_range(high_5s: float, range_5s: float, price: float) -> bool:
+    """No-instant-fade: price must hold within the top of the 5s range."""
+    return range_5s == 0 or high_5s - price <= (1.0 - _NO_FADE_FRAC) * range_5s
+
 class StrategyLogic:
     """Stateless logic for strategy triggers and exits."""
     
@@ -40,18 +204,31 @@ class StrategyLogic:
     def is_in_window(dt: datetime) -> bool:
         """Check if current time is within any premarket trading window."""
         # For testing purposes, we might want to bypass this or ensure it's correct
-        if getattr(config, 'BYPASS_TIME_WINDOW', False):
+        if _BYPASS_TIME_WINDOW:
             return True
             
-        current_time = dt.strftime("%H:%M:%S")
-        for start, end in config.PREMARKET_WINDOWS:
-            if start <= current_time <= end:
+        m = _MINUTE_MAP[dt.hour * 60 + dt.minute]
+        if m != 2:
+            return m == 1
+        sec = dt.hour * 3600 + dt.minute * 60 + dt.second
+        for start, end in _WINDOWS_SEC:
+            if start <= sec <= end:
                 return True
         return False
 
     @staticmethod
-    def check_shock_1s(data: MarketData) -> (bool, str):
-        """LAYER A: SHOCK DETECTOR (1s)."""
+    def is_in_window_vec(ts: np.ndarray) -> np.ndarray:
+        """Vectorized is_in_window over an array of datetime64 timestamps."""
+        if _BYPASS_TIME_WINDOW:
+            return np.ones(len(ts), dtype=bool)
+
+        ts = np.asarray(ts, dtype='datetime64[s]')
+        secs = (ts - ts.astype('datetime64[D]')).astype(np.int64)
+        return (np.searchsorted(_WINDOW_EDGES, secs, side='right') & 1).astype(bool)
+
+    @staticmethod
+    def check_shock_1s(data: MarketData, verbose: bool = False) -> (bool, str):
+        """LAYER A: SHOCK DETECTOR (1s). `verbose` also formats the reason when the check fails."""
         if not data.bars_1s:
             return False, "No 1s data"
             
@@ -64,8 +241,8 @@ class StrategyLogic:
         ret_1s = (last_1s.close - last_1s.open) / last_1s.open
         
         # Primary check: 1s shock
-        is_shock = (ret_1s >= config.SHOCK_RET_1S and 
-                    last_1s.volume >= config.SHOCK_VOL_MULT_1S * data.med_vol_1s)
+        is_shock = (ret_1s >= _SHOCK_RET_1S and 
+                    last_1s.volume >= _SHOCK_VOL_MULT_1S * data.med_vol_1s)
         
         # Alternative: 2s shock
         if not is_shock and len(data.bars_1s) >= 2:
@@ -73,15 +250,16 @@ class StrategyLogic:
             if prev_1s.open > 0:
                 ret_2s = (last_1s.close - prev_1s.open) / prev_1s.open
                 vol_2s = last_1s.volume + prev_1s.volume
-                is_shock = (ret_2s >= config.SHOCK_RET_2S and 
-                            vol_2s >= config.SHOCK_VOL_MULT_2S * data.med_vol_1s)
+                is_shock = (ret_2s >= _SHOCK_RET_2S and 
+                            vol_2s >= _SHOCK_VOL_MULT_2S * data.med_vol_1s)
         
-        reason = f"Shock: {ret_1s:.2%} ret, {last_1s.volume:.0f} vol (vs {data.med_vol_1s:.0f} med)"
-        return is_shock, reason
+        if not is_shock and not verbose:
+            return False, "No shock"
+        return is_shock, f"Shock: {ret_1s:.2%} ret, {last_1s.volume:.0f} vol (vs {data.med_vol_1s:.0f} med)"
 
     @staticmethod
-    def check_confirm_5s(data: MarketData) -> (bool, str):
-        """LAYER B: CONTINUATION CONFIRM (5s)."""
+    def check_confirm_5s(data: MarketData, verbose: bool = False) -> (bool, str):
+        """LAYER B: CONTINUATION CONFIRM (5s). `verbose` also formats the reason when the check fails."""
         if not data.bars_5s:
             return False, "No 5s data"
             
@@ -91,20 +269,10 @@ class StrategyLogic:
         if last_5s.open == 0:
             return False, "Invalid bar: open=0"
         
-        ret_5s = (last_5s.close - last_5s.open) / last_5s.open
-        range_5s = last_5s.high - last_5s.low
-        
-        is_confirm = (ret_5s >= config.CONFIRM_RET_5S and 
-                      last_5s.volume >= config.CONFIRM_VOL_MULT_5S * data.med_vol_5s and
-                      range_5s >= config.RANGE_MULT_5S * data.med_range_5s)
-        
-        # VWAP requirement bypass for testing or specific rules
-        if not getattr(config, 'BYPASS_VWAP_CHECK', False):
-            if data.price < 1.05 * data.vwap:
-                is_confirm = False
-        
-        reason = f"Confirm: {ret_5s:.2%} ret, {last_5s.volume:.0f} vol, {range_5s:.3f} range"
-        return is_confirm, reason
+        is_confirm, ret_5s, range_5s = _confirm_5s(data, last_5s)
+        if not is_confirm and not verbose:
+            return False, "No confirm"
+        return is_confirm, f"Confirm: {ret_5s:.2%} ret, {last_5s.volume:.0f} vol, {range_5s:.3f} range"
 
     @staticmethod
     def check_no_fade(data: MarketData) -> bool:
@@ -112,33 +280,48 @@ class StrategyLogic:
         if not data.bars_5s:
             return False
         last_5s = data.bars_5s[-1]
-        range_5s = last_5s.high - last_5s.low
-        if range_5s == 0: return True
-        
-        # Must hold within top X% of the 5s range
-        pullback = last_5s.high - data.price
-        return pullback <= (1.0 - config.NO_FADE_FRAC) * range_5s
+        return _holds_range(last_5s.high, last_5s.high - last_5s.low, data.price)
 
     @staticmethod
     def check_exec_safety(data: MarketData) -> (bool, str):
         """Execution constraints using IBKR bid/ask."""
-        if data.bid == 0 or data.ask == 0:
-            return False, "No bid/ask"
-            
-        spread_pct = (data.ask - data.bid) / data.bid
-        if spread_pct > config.MAX_SPREAD_PCT / 100.0:
-            return False, f"Spread too wide: {spread_pct:.2%}"
-            
-        # Spread relative to move magnitude
+        ret_5s_abs = 0.0
         if data.bars_5s:
             last_5s = data.bars_5s[-1]
             if last_5s.open > 0:
                 ret_5s_abs = abs((last_5s.close - last_5s.open) / last_5s.open)
-                if ret_5s_abs > 0 and spread_pct > config.SPREAD_REL_MULT * ret_5s_abs:
-                    return False, f"Spread too wide rel to move: {spread_pct:.2%} vs {ret_5s_abs:.2%}"
-            
+        fail = _exec_safety(data.bid, data.ask, ret_5s_abs)
+        if fail:
+            return False, fail
         return True, "EXEC_OK"
 
+    @staticmethod
+    def evaluate_entry(data: MarketData) -> (bool, str):
+        """ARMED-state gate: check_confirm_5s, check_exec_safety and check_no_fade in one pass.
+
+        Returns (True, confirm reason) when all pass, else (False, status naming the first failing gate).
+        """
+        if not data.bars_5s:
+            return False, "WAIT_CONFIRM: No 5s data"
+        last_5s = data.bars_5s[-1]
+        if last_5s.open == 0:
+            return False, "WAIT_CONFIRM: Invalid bar: open=0"
+
+        # Same gates as check_confirm_5s, check_exec_safety and check_no_fade, on one 5s bar read
+        is_confirm, ret_5s, range_5s = _confirm_5s(data, last_5s)
+        c_reason = f"Confirm: {ret_5s:.2%} ret, {last_5s.volume:.0f} vol, {range_5s:.3f} range"
+        if not is_confirm:
+            return False, f"WAIT_CONFIRM: {c_reason}"
+
+        fail = _exec_safety(data.bid, data.ask, abs(ret_5s))
+        if fail:
+            return False, f"WAIT_SAFETY: {fail}"
+
+        if not _holds_range(last_5s.high, range_5s, data.price):
+            return False, "WAIT_NO_FADE"
+
+        return True, c_reason
+
     @staticmethod
     def check_exit(data: MarketData, entry_price: float, stop_price: float, entry_time: datetime, R: float) -> (bool, str):
         """Risk management exits."""
@@ -153,19 +336,19 @@ class StrategyLogic:
             last_1s = data.bars_1s[-1]
             if last_1s.open > 0:
                 ret_1s = (last_1s.close - last_1s.open) / last_1s.open
-                if ret_1s <= -config.FAIL_RET_1S:
+                if ret_1s <= -_FAIL_RET_1S:
                     return True, "WEAKNESS_EXIT"
         
         # 3. Take Profit (R-multiple)
-        target = entry_price + (config.TP_R_MULT * R)
+        target = entry_price + (_TP_R_MULT * R)
         if data.price >= target:
             return True, "TAKE_PROFIT"
             
         # 4. Time Stop (Trailing-style)
-        elapsed = (datetime.now() - entry_time).total_seconds()
-        if elapsed >= config.TIME_STOP_SECONDS:
+        # Clock from the data, not the wall: identical in live trading and replay
+        if data.timestamp - entry_time >= _TIME_STOP:
             pnl_r = (data.price - entry_price) / R if R > 0 else 0
-            if pnl_r < config.MIN_PNL_AT_TIME:
+            if pnl_r < _MIN_PNL_AT_TIME:
                 return True, "TIME_STOP"
                 
         return False, ""
@@ -175,16 +358,10 @@ class StrategyLogic:
         """Calculate rolling medians for volume and range."""
         if not bars: return 1.0, 0.01, 0.0 # Robust floor
         
-        volumes = sorted([b.volume for b in bars])
-        if not volumes: return 1.0, 0.01, 0.0
-        
-        mid = len(volumes) // 2
-        med_vol = volumes[mid] if len(volumes) % 2 != 0 else (volumes[mid-1] + volumes[mid]) / 2.0
-        
-        ranges = sorted([b.high - b.low for b in bars])
-        if not ranges: return max(1.0, med_vol), 0.01, 0.0
-        
-        mid_r = len(ranges) // 2
-        med_range = ranges[mid_r] if len(ranges) % 2 != 0 else (ranges[mid_r-1] + ranges[mid_r]) / 2.0
+        n = len(bars)
+        volumes = np.fromiter((b.volume for b in bars), dtype=np.float64, count=n)
+        ranges = np.fromiter((b.high - b.low for b in bars), dtype=np.float64, count=n)
+        med_vol = _median_select(volumes)
+        med_range = _median_select(ranges)
         
         return max(1.0, med_vol), max(0.001, med_range), 0.0
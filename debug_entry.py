@@ -19,7 +19,7 @@ def debug_fat_entry():
     shock_bar = Bar(now - timedelta(seconds=4), 0.3951, 0.4050, 0.3951, 0.4050, 15000)
     data.bars_1s = [shock_bar]
     
-    shock_ok, s_reason = StrategyLogic.check_shock_1s(data)
+    shock_ok, s_reason = StrategyLogic.check_shock_1s(data, verbose=True)
     print(f"Step 1: Shock Check -> {shock_ok} ({s_reason})")
     
     # 3. Simulate the CONFIRM (5s layer)
@@ -27,7 +27,7 @@ def debug_fat_entry():
     confirm_bar = Bar(now, 0.3951, 0.4200, 0.3951, 0.4200, 74810) # 74.81K vol from screenshot
     data.bars_5s = [confirm_bar]
     
-    confirm_ok, c_reason = StrategyLogic.check_confirm_5s(data)
+    confirm_ok, c_reason = StrategyLogic.check_confirm_5s(data, verbose=True)
     print(f"Step 2: Confirm Check -> {confirm_ok} ({c_reason})")
     
     # 4. Check No-Fade Filter
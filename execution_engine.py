@@ -2,98 +2,146 @@
 Execution Engine for IBKR Premarket Strategy
 Handles aggressive limit orders, timeouts, and state tracking.
 """
+import heapq
+import queue
 import threading
 import time
 import logging
+from collections import deque
+from itertools import islice
+from dataclasses import dataclass, field
 from datetime import datetime
+from types import MappingProxyType
 from typing import Dict, Optional, List, Set, Tuple
 from ibapi.contract import Contract
 from ibapi.order import Order
 import strategy_config as config
 
+# Terminal order statuses that end an order without (full) execution
+_CANCEL_STATUSES = frozenset({'Cancelled', 'Inactive', 'ApiCancelled'})
+
+@dataclass(slots=True)
+class Position:
+    """Live position state for one symbol; fill fields stay 0 until the entry fills."""
+    status: str
+    entry_price: float
+    stop_price: float
+    R: float
+    shares: int
+    entry_time: datetime
+    order_id: int
+    order_ids: Set[int] = field(default_factory=set)
+    actual_entry_price: float = 0.0
+    filled_shares: int = 0
+    exit_reason: str = 'UNKNOWN'
+
 class ExecutionEngine:
     def __init__(self, tws_app, account: str):
         self.tws_app = tws_app
         self.account = account
         
-        # State: symbol -> {status, entry_price, stop_price, R, shares, entry_time, order_id, ...}
-        self.positions: Dict[str, Dict] = {}
+        # State: symbol -> Position
+        self.positions: Dict[str, Position] = {}
         self.order_to_symbol: Dict[int, str] = {}
-        self.trade_history: List[Dict] = []
-        self.blacklist: Set[str] = set()
+        self.trade_history: deque = deque(maxlen=config.TRADE_HISTORY_CAP)
+        # Read-only snapshots, rebuilt by writers under self.lock and read without it
+        self._positions_view = MappingProxyType({})
+        self.blacklist: frozenset = frozenset()
         self.consecutive_losses: int = 0
+        self._investment_c: int = round(config.INVESTMENT_PER_TRADE * 100)
+        # symbol -> Contract; contracts are only read by placeOrder, so one per symbol is shared
+        self._contracts: Dict[str, Contract] = {}
         
         self.lock = threading.Lock()
         
+        # Entry timeouts: min-heap of (deadline, symbol, order_id) served by one timer thread
+        self._timeouts: List[Tuple[float, str, int]] = []
+        self._timeout_cv = threading.Condition()
+        threading.Thread(target=self._timeout_loop, daemon=True).start()
+        
+        # Outbound TWS requests (placeOrder/cancelOrder), written by one thread outside self.lock
+        self._outbox = queue.SimpleQueue()
+        threading.Thread(target=self._writer_loop, daemon=True).start()
+        
+        # Order status -> handler; statuses not listed are ignored
+        self._status_handlers = {'Filled': self._on_filled}
+        self._status_handlers.update(dict.fromkeys(_CANCEL_STATUSES, self._on_cancelled))
+        
         # Callbacks
         self.tws_app.order_status_callbacks.append(self._on_order_status)
-        self.tws_app.error_callbacks = getattr(self.tws_app, 'error_callbacks', [])
-        self.tws_app.error_callbacks.append(self._on_tws_error)
+        self.tws_app.error_handlers[201].append(self._on_tws_error) # Order rejected
 
     def _create_contract(self, symbol: str) -> Contract:
-        contract = Contract()
-        contract.symbol = symbol
-        contract.secType = "STK"
-        contract.exchange = "SMART"
-        contract.currency = "USD"
+        contract = self._contracts.get(symbol)
+        if contract is None:
+            contract = Contract()
+            contract.symbol = symbol
+            contract.secType = "STK"
+            contract.exchange = "SMART"
+            contract.currency = "USD"
+            self._contracts[symbol] = contract
         return contract
 
     def _on_tws_error(self, reqId: int, errorCode: int, errorString: str):
-        if errorCode == 201: # Order rejected
-            symbol = self.order_to_symbol.get(reqId)
-            if symbol:
-                logging.error(f"[EXEC] {symbol} REJECTED: {errorString}")
-                with self.lock:
-                    self.blacklist.add(symbol)
-                    if symbol in self.positions:
-                        self._cleanup_position(symbol, "REJECTED")
+        """Order rejected (201): blacklist the symbol and drop its position."""
+        symbol = self.order_to_symbol.get(reqId)
+        if symbol:
+            logging.error("[EXEC] %s REJECTED: %s", symbol, errorString)
+            with self.lock:
+                self.blacklist = self.blacklist | {symbol}
+                if symbol in self.positions:
+                    self._cleanup_position(symbol, "REJECTED")
 
     def _on_order_status(self, orderId, status, filled, remaining, avgFillPrice, parentId):
+        handler = self._status_handlers.get(status)
+        if handler is None:
+            return # PreSubmitted/Submitted/...: no state change
+        # Read the clock before taking the lock; only fills record a time
+        now = datetime.now() if status == 'Filled' else None
         with self.lock:
             symbol = self.order_to_symbol.get(orderId)
             if not symbol or symbol not in self.positions:
                 return
-                
-            pos = self.positions[symbol]
-            
-            if status == 'Filled':
-                if pos['status'] == 'SUBMITTING':
-                    pos['status'] = 'IN_TRADE'
-                    pos['actual_entry_price'] = avgFillPrice
-                    pos['filled_shares'] = filled
-                    logging.info(f"[EXEC] >>> {symbol} FILLED at ${avgFillPrice:.2f} <<<")
-                elif pos['status'] == 'EXITING':
-                    logging.info(f"[EXEC] >>> {symbol} CLOSED at ${avgFillPrice:.2f} <<<")
-                    self._record_trade(symbol, "CLOSED", avgFillPrice)
-                    self._cleanup_position(symbol)
-
-            elif status in ['Cancelled', 'Inactive', 'ApiCancelled']:
-                if pos['status'] == 'SUBMITTING':
-                    if filled > 0:
-                        logging.info(f"[EXEC] {symbol} PARTIAL FILL: {filled} shares at ${avgFillPrice:.2f}")
-                        pos['status'] = 'IN_TRADE'
-                        pos['actual_entry_price'] = avgFillPrice
-                        pos['filled_shares'] = filled
-                    else:
-                        logging.info(f"[EXEC] {symbol} entry order CANCELLED/INACTIVE")
-                        self._cleanup_position(symbol)
-                elif pos['status'] == 'EXITING':
-                    # If exit order is cancelled, we might need to retry or it's a major issue
-                    logging.warning(f"[EXEC] WARNING: Exit order for {symbol} was {status}")
+            handler(symbol, self.positions[symbol], status, filled, avgFillPrice, now)
+
+    def _on_filled(self, symbol, pos, status, filled, avgFillPrice, now):
+        if pos.status == 'SUBMITTING':
+            pos.status = 'IN_TRADE'
+            pos.actual_entry_price = avgFillPrice
+            pos.filled_shares = filled
+            logging.info("[EXEC] >>> %s FILLED at $%.2f <<<", symbol, avgFillPrice)
+        elif pos.status == 'EXITING':
+            logging.info("[EXEC] >>> %s CLOSED at $%.2f <<<", symbol, avgFillPrice)
+            self._record_trade(symbol, "CLOSED", avgFillPrice, now)
+            self._cleanup_position(symbol)
+
+    def _on_cancelled(self, symbol, pos, status, filled, avgFillPrice, now):
+        if pos.status == 'SUBMITTING':
+            if filled > 0:
+                logging.info("[EXEC] %s PARTIAL FILL: %s shares at $%.2f", symbol, filled, avgFillPrice)
+                pos.status = 'IN_TRADE'
+                pos.actual_entry_price = avgFillPrice
+                pos.filled_shares = filled
+            else:
+                logging.info("[EXEC] %s entry order CANCELLED/INACTIVE", symbol)
+                self._cleanup_position(symbol)
+        elif pos.status == 'EXITING':
+            # If exit order is cancelled, we might need to retry or it's a major issue
+            logging.warning("[EXEC] WARNING: Exit order for %s was %s", symbol, status)
 
     def _cleanup_position(self, symbol: str, reason: str = ""):
         if symbol in self.positions:
             pos = self.positions[symbol]
-            # Clean up order mapping
-            oids = [oid for oid, sym in self.order_to_symbol.items() if sym == symbol]
-            for oid in oids:
-                if oid in self.order_to_symbol: del self.order_to_symbol[oid]
+            # Clean up order mapping: each position tracks its own order ids
+            for oid in pos.order_ids:
+                self.order_to_symbol.pop(oid, None)
             del self.positions[symbol]
+            self._positions_view = MappingProxyType(dict(self.positions))
 
-    def _record_trade(self, symbol: str, type: str, exit_price: float):
+    def _record_trade(self, symbol: str, type: str, exit_price: float, exit_time: datetime):
         pos = self.positions[symbol]
-        entry_price = pos.get('actual_entry_price', pos['entry_price'])
-        shares = pos.get('filled_shares', pos['shares'])
+        entry_price = pos.actual_entry_price or pos.entry_price
+        shares = pos.filled_shares or pos.shares
         pnl = (exit_price - entry_price) * shares
         
         if pnl < 0:
@@ -107,23 +155,26 @@ class ExecutionEngine:
             'exit_price': exit_price,
             'shares': shares,
             'pnl': pnl,
-            'time': datetime.now(),
-            'exit_reason': pos.get('exit_reason', 'UNKNOWN')
+            'time': exit_time,
+            'exit_reason': pos.exit_reason
         })
 
     def execute_entry(self, symbol: str, ask_price: float, stop_price: float, R: float) -> bool:
         """Place an aggressive limit buy order with timeout."""
+        now = datetime.now()
         with self.lock:
             if symbol in self.positions or symbol in self.blacklist:
                 return False
             
             if self.consecutive_losses >= config.MAX_CONSECUTIVE_LOSSES:
-                logging.warning(f"[EXEC] Kill switch active: {self.consecutive_losses} consecutive losses.")
+                logging.warning("[EXEC] Kill switch active: %d consecutive losses.", self.consecutive_losses)
                 return False
 
-            limit_price = round(ask_price + config.ENTRY_OFFSET, 2)
-            # Ensure integer shares for compatibility with older API versions
-            shares = int(config.INVESTMENT_PER_TRADE // limit_price)
+            # Size in integer cents: exact, and integer shares for compatibility with older API versions
+            limit_c = round((ask_price + config.ENTRY_OFFSET) * 100)
+            if limit_c <= 0: return False
+            limit_price = limit_c / 100
+            shares = self._investment_c // limit_c
             if shares <= 0: return False
             
             order_id = self.tws_app.next_order_id
@@ -144,49 +195,77 @@ class ExecutionEngine:
             # Some versions of TWS require this for premarket
             order.overridePercentageConstraints = True
             
-            self.positions[symbol] = {
-                'status': 'SUBMITTING',
-                'entry_price': limit_price,
-                'stop_price': stop_price,
-                'R': R,
-                'shares': shares,
-                'entry_time': datetime.now(),
-                'order_id': order_id
-            }
+            self.positions[symbol] = Position(
+                status='SUBMITTING',
+                entry_price=limit_price,
+                stop_price=stop_price,
+                R=R,
+                shares=shares,
+                entry_time=now,
+                order_id=order_id,
+                order_ids={order_id}
+            )
+            self._positions_view = MappingProxyType(dict(self.positions))
             self.order_to_symbol[order_id] = symbol
             
-            self.tws_app.placeOrder(order_id, contract, order)
-            logging.info(f"[EXEC] Entry submitted for {symbol}: {shares} @ ${limit_price}")
+            self._outbox.put((self.tws_app.placeOrder, (order_id, contract, order)))
+            logging.info("[EXEC] Entry submitted for %s: %s @ $%s", symbol, shares, limit_price)
             
-            # Start timeout thread
-            threading.Thread(target=self._handle_entry_timeout, args=(symbol, order_id), daemon=True).start()
+            # Schedule the entry timeout
+            deadline = time.monotonic() + config.ENTRY_TIMEOUT_MS / 1000.0
+            with self._timeout_cv:
+                heapq.heappush(self._timeouts, (deadline, symbol, order_id))
+                self._timeout_cv.notify()
             return True
 
+    def _writer_loop(self):
+        """Send queued TWS requests in submission order."""
+        while True:
+            send, args = self._outbox.get()
+            try:
+                send(*args)
+            except Exception as e:
+                logging.error("[EXEC] Outbound request failed: %s", e)
+
+    def _timeout_loop(self):
+        """Wait for the earliest entry deadline and fire it; runs on a single daemon thread."""
+        while True:
+            with self._timeout_cv:
+                while not self._timeouts:
+                    self._timeout_cv.wait()
+                delay = self._timeouts[0][0] - time.monotonic()
+                if delay > 0:
+                    # Re-check on wake: an earlier deadline may have been pushed meanwhile
+                    self._timeout_cv.wait(delay)
+                    continue
+                _, symbol, order_id = heapq.heappop(self._timeouts)
+            # Outside the condition: the handler takes self.lock, which execute_entry holds while pushing
+            self._handle_entry_timeout(symbol, order_id)
+
     def _handle_entry_timeout(self, symbol: str, order_id: int):
-        time.sleep(config.ENTRY_TIMEOUT_MS / 1000.0)
         with self.lock:
-            if symbol in self.positions and self.positions[symbol]['status'] == 'SUBMITTING':
-                logging.info(f"[EXEC] Timeout reached for {symbol} entry. Cancelling.")
-                self.tws_app.cancelOrder(order_id)
+            if symbol in self.positions and self.positions[symbol].status == 'SUBMITTING':
+                logging.info("[EXEC] Timeout reached for %s entry. Cancelling.", symbol)
+                self._outbox.put((self.tws_app.cancelOrder, (order_id,)))
                 # Status will be updated via _on_order_status
 
     def execute_exit(self, symbol: str, price: float, reason: str):
         """Exit position with a market order (or aggressive limit)."""
         with self.lock:
-            if symbol not in self.positions or self.positions[symbol]['status'] != 'IN_TRADE':
+            if symbol not in self.positions or self.positions[symbol].status != 'IN_TRADE':
                 return
             
             pos = self.positions[symbol]
-            pos['status'] = 'EXITING'
-            pos['exit_reason'] = reason
+            pos.status = 'EXITING'
+            pos.exit_reason = reason
             
             contract = self._create_contract(symbol)
             order = Order()
             order.action = "SELL"
             order.orderType = "LMT"
             # More aggressive exit to ensure fill in premarket
-            order.lmtPrice = round(price * 0.95, 2) 
-            order.totalQuantity = pos['filled_shares']
+            order.lmtPrice = (round(price * 100) * 95 // 100) / 100 # 95% of price, floored to the cent
+            order.totalQuantity = pos.filled_shares
             order.account = self.account
             order.outsideRth = True
             order.transmit = True
@@ -196,10 +275,21 @@ class ExecutionEngine:
             order_id = self.tws_app.next_order_id
             self.tws_app.next_order_id += 1
             self.order_to_symbol[order_id] = symbol
+            pos.order_ids.add(order_id)
             
-            self.tws_app.placeOrder(order_id, contract, order)
-            logging.info(f"[EXEC] Exit submitted for {symbol} ({reason})")
+            self._outbox.put((self.tws_app.placeOrder, (order_id, contract, order)))
+            logging.info("[EXEC] Exit submitted for %s (%s)", symbol, reason)
+
+    def get_position(self, symbol: str) -> Optional[Position]:
+        return self._positions_view.get(symbol)
+
+    def get_positions(self) -> MappingProxyType:
+        """Read-only symbol -> Position snapshot; safe to iterate while callbacks update the engine."""
+        return self._positions_view
 
-    def get_position(self, symbol: str) -> Optional[Dict]:
+    def get_trade_history(self, last: Optional[int] = None) -> List[Dict]:
+        """Completed trades, oldest first; `last` limits the copy to the most recent n."""
         with self.lock:
-            return self.positions.get(symbol)
+            if last is None:
+                return list(self.trade_history)
+            return list(islice(reversed(self.trade_history), last))[::-1]
@@ -1,49 +1,86 @@
 """
 Real-time Runner for Premarket Strategy with Terminal Dashboard
 """
+import atexit
 import time
 import os
+import sys
 import logging
+import queue
 import threading
+from logging.handlers import QueueHandler, QueueListener
 from datetime import datetime, timedelta
-from collections import deque
-from typing import Dict, List, Optional
+from typing import Dict, List, NamedTuple, Optional
 import strategy_config as config
-from conditions import MarketData, StrategyLogic, Bar
+from conditions import MarketData, StrategyLogic, Bar, RollingMedian, BARS_1S_CAP, BARS_5S_CAP
 from execution_engine import ExecutionEngine
 from tws_data_fetcher import create_tws_data_app
 
-# Configure logging to file only to keep terminal clean for dashboard
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s [%(levelname)s] %(message)s',
-    handlers=[logging.FileHandler("strategy.log")]
-)
+# Configure logging to file only to keep terminal clean for dashboard.
+# Callers only enqueue records; a listener thread does the formatting and file I/O.
+_log_file = logging.FileHandler("strategy.log")
+_log_file.setFormatter(logging.Formatter('%(asctime)s [%(levelname)s] %(message)s'))
+_log_queue = queue.SimpleQueue()
+_log_listener = QueueListener(_log_queue, _log_file)
+_log_listener.start()
+atexit.register(_log_listener.stop)
+_log_enqueue = QueueHandler(_log_queue)
+_log_enqueue.setFormatter(logging.Formatter('%(message)s'))
+logging.basicConfig(level=logging.INFO, handlers=[_log_enqueue])
 logging.getLogger('ibapi').setLevel(logging.WARNING)
 
+class Snapshot(NamedTuple):
+    """Immutable per-symbol view published for the dashboard thread."""
+    price: float
+    vwap: float
+    bid: float
+    ask: float
+    v1: float
+    v5: float
+    mv1: float
+    mv5: float
+    state: str
+    reason: str
+
 class SymbolMonitor:
     def __init__(self, symbol: str, tws_app, executor: ExecutionEngine):
         self.symbol = symbol
         self.tws_app = tws_app
         self.executor = executor
         
-        self.bars_1s = deque(maxlen=300)
-        self.bars_5s = deque(maxlen=120)
+        self.market_data = MarketData(symbol=symbol, price=0.0, timestamp=datetime.now())
+        self.market_data.med_vol_1s = 1.0
+        self.market_data.med_vol_5s = 1.0
+        self.market_data.med_range_5s = 0.01
+        # Bar windows are MarketData's own deques: StrategyLogic reads them in place, no copies
+        self.bars_1s = self.market_data.bars_1s
+        self.bars_5s = self.market_data.bars_5s
+        # Medians over the same windows, updated as each bar closes
+        self.med_vol_1s = RollingMedian(BARS_1S_CAP)
+        self.med_vol_5s = RollingMedian(BARS_5S_CAP)
+        self.med_range_5s = RollingMedian(BARS_5S_CAP)
         
-        self.curr_1s_data = []
-        self.curr_5s_data = []
+        # Ticks from the TWS reader thread, applied by on_timer so bars and state
+        # are only ever mutated on the strategy thread
+        self._ticks = queue.SimpleQueue()
+        # Open bars as [open, high, low, close, volume], None until the first tick
+        self.curr_1s = None
+        self.curr_5s = None
+        self._bar_1s_dirty = True # a 1s bar closed since the last IDLE shock check
         self.last_1s_ts = None
         self.last_5s_ts = None
+        # Integer bucket keys (epoch-day seconds, and that // 5) of the open bars
+        self.last_1s_key = -1
+        self.last_5s_key = -1
         
         self.state = "WARMUP"
         self.arm_time = None
         self.last_reason = "WARMING_UP"
         self.warmup_start_time = datetime.now()
         
-        self.market_data = MarketData(symbol=symbol, price=0.0, timestamp=datetime.now())
-        
         # Preload history
         self._preload_history()
+        self._publish_snapshot()
 
     def _preload_history(self):
         """Fetch last few minutes of bars to warm up medians and VWAP."""
@@ -55,20 +92,45 @@ class SymbolMonitor:
             # Fetch 5s bars
             bars_5s = self.tws_app.fetch_historical_bars(self.symbol, end_dt, duration=duration, bar_size="5 secs")
             for b in bars_5s:
-                bar = Bar(b['date'], b['open'], b['high'], b['low'], b['close'], b['volume'], b['average'])
-                self.bars_5s.append(bar)
+                self._add_bar_5s(Bar.from_dict(b))
             
             # Fetch 1s bars
             bars_1s = self.tws_app.fetch_historical_bars(self.symbol, end_dt, duration=duration, bar_size="1 secs")
             for b in bars_1s:
-                bar = Bar(b['date'], b['open'], b['high'], b['low'], b['close'], b['volume'], b['average'])
-                self.bars_1s.append(bar)
+                self._add_bar_1s(Bar.from_dict(b))
                 
             logging.info(f"[{self.symbol}] Preloaded {len(self.bars_1s)} 1s-bars and {len(self.bars_5s)} 5s-bars.")
         except Exception as e:
             logging.error(f"[{self.symbol}] History preload failed: {e}. Falling back to time-based warm-up.")
 
+    def _add_bar_1s(self, bar: Bar):
+        self.bars_1s.append(bar)
+        self._bar_1s_dirty = True
+        self.med_vol_1s.push(bar.volume)
+        self.market_data.med_vol_1s = max(1.0, self.med_vol_1s.median(1.0))
+
+    def _add_bar_5s(self, bar: Bar):
+        self.bars_5s.append(bar)
+        self.med_vol_5s.push(bar.volume)
+        self.med_range_5s.push(bar.high - bar.low)
+        self.market_data.med_vol_5s = max(1.0, self.med_vol_5s.median(1.0))
+        self.market_data.med_range_5s = max(0.001, self.med_range_5s.median(0.01))
+
     def on_tick(self, symbol, price, size, vwap, timestamp, bid, ask):
+        """TWS reader thread: just hand the tick over; on_timer applies it."""
+        self._ticks.put((price, size, vwap, timestamp, bid, ask))
+
+    def _drain_ticks(self):
+        """Apply queued ticks in arrival order on the strategy thread."""
+        ticks = self._ticks
+        while True:
+            try:
+                price, size, vwap, timestamp, bid, ask = ticks.get_nowait()
+            except queue.Empty:
+                return
+            self._apply_tick(price, size, vwap, timestamp, bid, ask)
+
+    def _apply_tick(self, price, size, vwap, timestamp, bid, ask):
         self.market_data.timestamp = timestamp
         self.market_data.price = price
         self.market_data.volume = size
@@ -78,9 +140,11 @@ class SymbolMonitor:
         
         self._update_bars(price, size, vwap, timestamp)
 
-    def on_timer(self):
+    def on_timer(self, now: Optional[datetime] = None):
         """Called periodically to ensure state machine runs even without ticks."""
-        now = datetime.now()
+        self._drain_ticks()
+        if now is None:
+            now = datetime.now()
         # If we haven't received a tick yet, use current time for timestamp
         if not self.market_data.timestamp or (now - self.market_data.timestamp).total_seconds() > 1.0:
             self.market_data.timestamp = now
@@ -88,40 +152,55 @@ class SymbolMonitor:
         # Close current bars if needed based on time
         self._update_bars(self.market_data.price, 0, self.market_data.vwap, now)
         self._process_state_machine()
+        self._publish_snapshot()
+
+    def _publish_snapshot(self):
+        """Replace the dashboard snapshot; a single attribute store, so readers need no lock."""
+        md = self.market_data
+        self.snapshot = Snapshot(
+            md.price, md.vwap, md.bid, md.ask,
+            self.bars_1s[-1].volume if self.bars_1s else 0,
+            self.bars_5s[-1].volume if self.bars_5s else 0,
+            md.med_vol_1s, md.med_vol_5s, self.state, self.last_reason,
+        )
 
     def _update_bars(self, price, size, vwap, ts):
-        ts_1s = ts.replace(microsecond=0)
-        if self.last_1s_ts and ts_1s > self.last_1s_ts:
-            if self.curr_1s_data:
-                prices = [d[0] for d in self.curr_1s_data]
-                vols = [d[1] for d in self.curr_1s_data]
-                bar = Bar(self.last_1s_ts, prices[0], max(prices), min(prices), prices[-1], sum(vols), vwap)
-                self.bars_1s.append(bar)
-                self.curr_1s_data = []
-        self.last_1s_ts = ts_1s
-        self.curr_1s_data.append((price, size))
+        # Bucket with integer arithmetic; datetimes are only built when a bucket changes.
+        # Buckets only move forward: a sample older than the open bar (e.g. a timer pass whose
+        # clock was read before a later tick was drained) is merged into the open bar
+        key_1s = ts.toordinal() * 86400 + ts.hour * 3600 + ts.minute * 60 + ts.second
+        cur = self.curr_1s
+        if key_1s > self.last_1s_key:
+            if cur is not None:
+                self._add_bar_1s(Bar(self.last_1s_ts, cur[0], cur[1], cur[2], cur[3], cur[4], vwap))
+                cur = None
+            self.last_1s_key = key_1s
+            self.last_1s_ts = ts.replace(microsecond=0)
+        if cur is None:
+            self.curr_1s = [price, price, price, price, size]
+        else:
+            if price > cur[1]: cur[1] = price
+            if price < cur[2]: cur[2] = price
+            cur[3] = price
+            cur[4] += size
 
-        ts_5s = ts.replace(second=(ts.second // 5) * 5, microsecond=0)
-        if self.last_5s_ts and ts_5s > self.last_5s_ts:
-            if self.curr_5s_data:
-                prices = [d[0] for d in self.curr_5s_data]
-                vols = [d[1] for d in self.curr_5s_data]
-                bar = Bar(self.last_5s_ts, prices[0], max(prices), min(prices), prices[-1], sum(vols), vwap)
-                self.bars_5s.append(bar)
-                self.curr_5s_data = []
-        self.last_5s_ts = ts_5s
-        self.curr_5s_data.append((price, size))
+        key_5s = key_1s // 5
+        cur = self.curr_5s
+        if key_5s > self.last_5s_key:
+            if cur is not None:
+                self._add_bar_5s(Bar(self.last_5s_ts, cur[0], cur[1], cur[2], cur[3], cur[4], vwap))
+                cur = None
+            self.last_5s_key = key_5s
+            self.last_5s_ts = ts.replace(second=(ts.second // 5) * 5, microsecond=0)
+        if cur is None:
+            self.curr_5s = [price, price, price, price, size]
+        else:
+            if price > cur[1]: cur[1] = price
+            if price < cur[2]: cur[2] = price
+            cur[3] = price
+            cur[4] += size
 
     def _process_state_machine(self):
-        self.market_data.bars_1s = list(self.bars_1s)
-        self.market_data.bars_5s = list(self.bars_5s)
-        
-        mv1, _, _ = StrategyLogic.calculate_medians(self.market_data.bars_1s, 120)
-        mv5, mr5, _ = StrategyLogic.calculate_medians(self.market_data.bars_5s, 120)
-        self.market_data.med_vol_1s = mv1
-        self.market_data.med_vol_5s = mv5
-        self.market_data.med_range_5s = mr5
-
         # Warm-up check
         if self.state == "WARMUP":
             bars_ok = (len(self.bars_1s) >= config.WARMUP_MIN_1S_BARS and 
@@ -130,45 +209,43 @@ class SymbolMonitor:
             
             if bars_ok or time_ok:
                 self.state = "IDLE"
+                self._bar_1s_dirty = True
                 self.last_reason = "WARMUP_COMPLETE"
                 logging.info(f"[{self.symbol}] Warm-up complete. 1s bars: {len(self.bars_1s)}, 5s bars: {len(self.bars_5s)}")
             else:
                 return # Still warming up
 
         pos = self.executor.get_position(self.symbol)
-        if pos and pos['status'] == 'IN_TRADE':
+        if pos and pos.status == 'IN_TRADE':
             self.state = "IN_TRADE"
         elif not pos:
             if self.state == "ARMED":
-                if (datetime.now() - self.arm_time).total_seconds() > config.ARM_TIMEOUT_SECONDS:
+                if time.monotonic() - self.arm_time > config.ARM_TIMEOUT_SECONDS:
                     self.state = "IDLE"
+                    self._bar_1s_dirty = True
                     self.last_reason = "ARM_TIMEOUT"
             elif self.state != "SUBMITTING" and self.state != "WARMUP":
+                if self.state != "IDLE":
+                    self._bar_1s_dirty = True
                 self.state = "IDLE"
 
         if self.state == "IDLE":
-            if StrategyLogic.is_in_window(self.market_data.timestamp):
+            # The shock check reads only the last 1s bar and its median: re-run it on a new bar, or
+            # on the first pass after returning to IDLE (every transition into IDLE sets the flag)
+            if self._bar_1s_dirty and StrategyLogic.is_in_window(self.market_data.timestamp):
+                self._bar_1s_dirty = False
                 shock_ok, reason = StrategyLogic.check_shock_1s(self.market_data)
                 if shock_ok:
                     self.state = "ARMED"
-                    self.arm_time = datetime.now()
+                    self.arm_time = time.monotonic()
                     self.last_reason = "SHOCK"
                     logging.info(f"[{self.symbol}] SHOCK: {reason}")
 
         elif self.state == "ARMED":
-            confirm_ok, c_reason = StrategyLogic.check_confirm_5s(self.market_data)
-            safety_ok, s_reason = StrategyLogic.check_exec_safety(self.market_data)
-            no_fade = StrategyLogic.check_no_fade(self.market_data)
-            
-            if not confirm_ok:
-                self.last_reason = f"WAIT_CONFIRM: {c_reason}"
-            elif not safety_ok:
-                self.last_reason = f"WAIT_SAFETY: {s_reason}"
-            elif not no_fade:
-                self.last_reason = "WAIT_NO_FADE"
-
-            if confirm_ok and safety_ok and no_fade:
-                last_5s = self.market_data.bars_5s[-1]
+            entry_ok, c_reason = StrategyLogic.evaluate_entry(self.market_data)
+            if not entry_ok:
+                self.last_reason = c_reason
+            else:
                 med_range = self.market_data.med_range_5s
                 stop_dist = max(self.market_data.ask - self.market_data.bid, config.STOP_RANGE_MULT * med_range, self.market_data.price * config.STOP_PCT)
                 
@@ -185,71 +262,104 @@ class SymbolMonitor:
         elif self.state == "IN_TRADE":
             pos = self.executor.get_position(self.symbol)
             exit_triggered, reason = StrategyLogic.check_exit(
-                self.market_data, pos['actual_entry_price'], pos['stop_price'], pos['entry_time'], pos['R']
+                self.market_data, pos.actual_entry_price, pos.stop_price, pos.entry_time, pos.R
             )
             if exit_triggered:
                 self.executor.execute_exit(self.symbol, self.market_data.price, reason)
                 self.state = "IDLE"
+                self._bar_1s_dirty = True
                 self.last_reason = f"EXIT_{reason}"
 
-def draw_dashboard(monitors: Dict[str, SymbolMonitor], executor: ExecutionEngine):
+# Dashboard separators and table headers, built once
+_RULE = "=" * 100
+_DASH = "-" * 100
+_MONITOR_HEADER = f"{'SYMBOL':<8} | {'PRICE':<7} | {'VWAP':<7} | {'BID/ASK':<13} | {'VOL 1s (MED)':<15} | {'VOL 5s (MED)':<15} | {'STATE':<8} | {'EVENT'}"
+_MONITOR_DASH = "-" * len(_MONITOR_HEADER)
+_POSITIONS_HEADER = f"{'SYMBOL':<8} | {'STATUS':<10} | {'ENTRY':<8} | {'TP':<8} | {'SL':<8} | {'SHARES':<6} | {'PNL':<8} | {'TIME'}"
+_HISTORY_HEADER = f"{'SYMBOL':<8} | {'RESULT':<8} | {'ENTRY':<8} | {'EXIT':<8} | {'PNL':<8} | {'REASON':<12} | {'TIME'}"
+
+def draw_dashboard(monitors: Dict[str, SymbolMonitor], executor: ExecutionEngine, refresh: threading.Event):
+    # symbol -> (rendered values, formatted row up to the TIME column); rebuilt only when one changes
+    position_rows = {}
+    if os.name == 'nt':
+        os.system('') # enable ANSI escape processing in the Windows console
+    # Clear + home via ANSI instead of spawning cls/clear; skip it when not on a terminal
+    clear = "\x1b[2J\x1b[H" if sys.stdout.isatty() else ""
     while True:
+        # Redraw when the strategy loop has published fresh snapshots; idle otherwise
+        if not refresh.wait(1.0):
+            continue
+        refresh.clear()
         try:
-            os.system('cls' if os.name == 'nt' else 'clear')
-            now_str = datetime.now().strftime("%H:%M:%S")
-            print("="*100)
-            print(f" PREMARKET SHOCK & CONFIRM STRATEGY | TIME: {now_str}")
-            print("="*100)
+            now = datetime.now() # one clock read per frame
+            now_str = now.strftime("%H:%M:%S")
+            # Build the whole frame, then emit it with one write
+            frame = []
+            w = frame.append
+            w(_RULE)
+            w(f" PREMARKET SHOCK & CONFIRM STRATEGY | TIME: {now_str}")
+            w(_RULE)
             
             # STAGE 1: MONITORING
-            header = f"{'SYMBOL':<8} | {'PRICE':<7} | {'VWAP':<7} | {'BID/ASK':<13} | {'VOL 1s (MED)':<15} | {'VOL 5s (MED)':<15} | {'STATE':<8} | {'EVENT'}"
-            print(header)
-            print("-" * len(header))
+            w(_MONITOR_HEADER)
+            w(_MONITOR_DASH)
             for sym in config.WATCHLIST:
                 m = monitors.get(sym)
                 if not m: continue
-                md = m.market_data
-                ba = f"{md.bid:.2f}/{md.ask:.2f}"
-                
-                # Get current bar volumes and medians
-                v1 = m.bars_1s[-1].volume if m.bars_1s else 0
-                v5 = m.bars_5s[-1].volume if m.bars_5s else 0
-                vol1_str = f"{v1:<5.0f} ({md.med_vol_1s:<5.0f})"
-                vol5_str = f"{v5:<5.0f} ({md.med_vol_5s:<5.0f})"
+                # Read the published snapshot only, never the live monitor state
+                snap = m.snapshot
+                ba = f"{snap.bid:.2f}/{snap.ask:.2f}"
+                vol1_str = f"{snap.v1:<5.0f} ({snap.mv1:<5.0f})"
+                vol5_str = f"{snap.v5:<5.0f} ({snap.mv5:<5.0f})"
                 
-                print(f"{sym:<8} | {md.price:<7.2f} | {md.vwap:<7.2f} | {ba:<13} | {vol1_str:<15} | {vol5_str:<15} | {m.state:<8} | {m.last_reason}")
+                w(f"{sym:<8} | {snap.price:<7.2f} | {snap.vwap:<7.2f} | {ba:<13} | {vol1_str:<15} | {vol5_str:<15} | {snap.state:<8} | {snap.reason}")
             
             # STAGE 2: ACTIVE POSITIONS
-            print("\n" + "="*100)
-            print(" ACTIVE POSITIONS")
-            print("="*100)
-            print(f"{'SYMBOL':<8} | {'STATUS':<10} | {'ENTRY':<8} | {'TP':<8} | {'SL':<8} | {'SHARES':<6} | {'PNL':<8} | {'TIME'}")
-            print("-" * 100)
+            w("\n" + _RULE)
+            w(" ACTIVE POSITIONS")
+            w(_RULE)
+            w(_POSITIONS_HEADER)
+            w(_DASH)
             active_any = False
-            for sym, pos in executor.positions.items():
+            positions = executor.get_positions()
+            for sym, pos in positions.items():
                 active_any = True
-                pnl = (monitors[sym].market_data.price - pos.get('actual_entry_price', pos['entry_price'])) * pos.get('filled_shares', pos['shares'])
-                tp = pos.get('actual_entry_price', pos['entry_price']) + config.TP_R_MULT * pos['R']
-                time_in = (datetime.now() - pos['entry_time']).total_seconds()
-                print(f"{sym:<8} | {pos['status']:<10} | {pos.get('actual_entry_price', 0):<8.2f} | {tp:<8.2f} | {pos['stop_price']:<8.2f} | {pos.get('filled_shares', 0):<6} | {pnl:<8.2f} | {int(time_in)}s")
+                price = monitors[sym].snapshot.price
+                pnl = (price - (pos.actual_entry_price or pos.entry_price)) * (pos.filled_shares or pos.shares)
+                tp = (pos.actual_entry_price or pos.entry_price) + config.TP_R_MULT * pos.R
+                # Key on the values as rendered (2 decimals), so a cached row never shows a stale PnL;
+                # the sign tells "-0.00" from "0.00"
+                key = (pos.status, round(pos.actual_entry_price, 2), round(tp, 2), round(pos.stop_price, 2),
+                       pos.filled_shares, round(pnl, 2), pnl < 0)
+                cached = position_rows.get(sym)
+                if cached is None or cached[0] != key:
+                    row = f"{sym:<8} | {pos.status:<10} | {pos.actual_entry_price:<8.2f} | {tp:<8.2f} | {pos.stop_price:<8.2f} | {pos.filled_shares:<6} | {pnl:<8.2f} | "
+                    cached = position_rows[sym] = (key, row)
+                time_in = (now - pos.entry_time).total_seconds()
+                w(f"{cached[1]}{int(time_in)}s")
+            # Forget rows of closed positions
+            for sym in position_rows.keys() - positions.keys():
+                del position_rows[sym]
             if not active_any:
-                print(" No active positions.")
+                w(" No active positions.")
 	
             # STAGE 3: TRADE HISTORY
-            print("\n" + "="*100)
-            print(" TRADE HISTORY")
-            print("="*100)
-            print(f"{'SYMBOL':<8} | {'RESULT':<8} | {'ENTRY':<8} | {'EXIT':<8} | {'PNL':<8} | {'REASON':<12} | {'TIME'}")
-            print("-" * 100)
-            if not executor.trade_history:
-                print(" No completed trades in this session.")
+            w("\n" + _RULE)
+            w(" TRADE HISTORY")
+            w(_RULE)
+            w(_HISTORY_HEADER)
+            w(_DASH)
+            recent_trades = executor.get_trade_history(last=5)
+            if not recent_trades:
+                w(" No completed trades in this session.")
             else:
-                for t in executor.trade_history[-5:]: # Show last 5
+                for t in recent_trades: # Show last 5
                     res = "WIN" if t['pnl'] > 0 else "LOSS"
-                    print(f"{t['symbol']:<8} | {res:<8} | {t['entry_price']:<8.2f} | {t['exit_price']:<8.2f} | {t['pnl']:<8.2f} | {t['exit_reason']:<12} | {t['time'].strftime('%H:%M:%S')}")
+                    w(f"{t['symbol']:<8} | {res:<8} | {t['entry_price']:<8.2f} | {t['exit_price']:<8.2f} | {t['pnl']:<8.2f} | {t['exit_reason']:<12} | {t['time'].strftime('%H:%M:%S')}")
             
-            print("="*100)
-            time.sleep(1)
+            w(_RULE)
+            sys.stdout.write(clear + "\n".join(frame) + "\n")
+            sys.stdout.flush()
         except Exception as e:
             logging.error(f"Dashboard error: {e}")
             time.sleep(1)
@@ -272,23 +382,23 @@ def run():
         monitors[symbol] = SymbolMonitor(symbol, tws_app, executor)
     print(f"\n[INIT] Preloading complete. Starting market data subscriptions...")
 
-    def create_callback(sym):
-        return lambda s, p, v, vw, ts, b, a: monitors[s].on_tick(s, p, v, vw, ts, b, a)
-
     for symbol in config.WATCHLIST:
-        tws_app.subscribe_market_data(symbol, create_callback(symbol))
+        tws_app.subscribe_market_data(symbol, monitors[symbol].on_tick)
 
-    # Start dashboard in a separate thread
-    dashboard_thread = threading.Thread(target=draw_dashboard, args=(monitors, executor), daemon=True)
+    # Start dashboard in a separate thread; it redraws after each timer pass
+    refresh = threading.Event()
+    dashboard_thread = threading.Thread(target=draw_dashboard, args=(monitors, executor, refresh), daemon=True)
     dashboard_thread.start()
 
     print("\n[INFO] PIPELINE TEST MODE: Press 'Enter' to force-trigger an entry on the first symbol...")
     
     try:
         while True:
-            # Run timer-based updates for all monitors
+            # Run timer-based updates for all monitors against one clock reading
+            now = datetime.now()
             for m in monitors.values():
-                m.on_timer()
+                m.on_timer(now)
+            refresh.set()
             
             # Non-blocking check for user input to force trigger (Cross-platform)
             try:
@@ -4,6 +4,9 @@ Usage: python run_historical_backtest.py --symbols MOVE,BNAI --date 2026-01-28
 """
 import argparse
 import logging
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from tws_data_fetcher import create_tws_data_app
 from backtest_scanner import BacktestEngine, run_backtest
@@ -14,15 +17,44 @@ logging.basicConfig(level=logging.INFO, format='%(message)s')
 # Suppress verbose IBKR internal logging
 logging.getLogger('ibapi').setLevel(logging.WARNING)
 
+# Trade table layout, parsed once instead of per row
+_TRADE_HEADER = f"{'ENTRY TIME':<20} | {'EXIT TIME':<20} | {'SHARES':<7} | {'ENTRY':<8} | {'EXIT':<8} | {'GROSS $':<9} | {'COMM $':<8} | {'NET $':<9} | {'NET %':<8} | {'REASON'}"
+_TRADE_DASH = "-" * 130
+_TRADE_ROW = "{:<20} | {:<20} | {:<7} | {:<8.2f} | {:<8.2f} | {:<9.2f} | {:<8.2f} | {:<9.2f} | {:<7.2f}% | {}".format
+
+def print_results(symbol, trades, final_capital):
+    if not trades:
+        print(f"[RESULT] {symbol}: No trades triggered.")
+        return
+
+    print(f"\n[TRADES] {symbol}:")
+    print(_TRADE_HEADER)
+    print(_TRADE_DASH)
+    # Totals are accumulated while printing rows: one pass over the trades
+    total_gross_pnl = total_commission = total_net_pnl = total_investment = 0.0
+    for t in trades:
+        total_gross_pnl += t['gross_pnl']
+        total_commission += t['commission']
+        total_net_pnl += t['pnl']
+        total_investment += t['investment']
+        e_time = t['entry_time'].strftime("%H:%M:%S")
+        x_time = t['exit_time'].strftime("%H:%M:%S")
+        print(_TRADE_ROW(e_time, x_time, t['shares'], t['entry_price'], t['exit_price'], t['gross_pnl'], t['commission'], t['pnl'], t['pnl_pct'], t['reason']))
+    
+    avg_pnl_pct = (total_net_pnl / total_investment * 100) if total_investment > 0 else 0
+    print(f"\n[SUMMARY] {symbol} Gross PnL: ${total_gross_pnl:.2f} | Commission: ${total_commission:.2f} | Net PnL: ${total_net_pnl:.2f} ({avg_pnl_pct:+.2f}%) | Final Capital: ${final_capital:.2f}\n")
+
 def main():
     parser = argparse.ArgumentParser(description='Premarket Strategy Historical Backtester')
     parser.add_argument('--symbols', type=str, help='Comma-separated symbols, e.g., MOVE,BNAI', default=",".join(config.WATCHLIST))
     parser.add_argument('--date', type=str, help='Date in YYYY-MM-DD format', default=datetime.now().strftime("%Y-%m-%d"))
     parser.add_argument('--host', type=str, default="2.tcp.ngrok.io", help='TWS host')
     parser.add_argument('--port', type=int, default=15861, help='TWS port')
+    parser.add_argument('--workers', type=int, default=0, help='Simulation processes (default: one per symbol, up to CPU count)')
     
     args = parser.parse_args()
-    symbols = [s.strip() for s in args.symbols.split(',')]
+    # Interned so per-symbol dict lookups compare by identity
+    symbols = tuple(sys.intern(s.strip()) for s in args.symbols.split(','))
     
     print("="*65)
     print(" PREMARKET STRATEGY HISTORICAL BACKTEST")
@@ -36,6 +68,9 @@ def main():
         print("[ERROR] Could not connect to TWS.")
         return
 
+    # Fetch serially (TWS pacing), then simulate symbols in parallel:
+    # each run_backtest call is independent and CPU-bound.
+    datasets = []
     try:
         for symbol in symbols:
             engine = BacktestEngine(symbol)
@@ -44,31 +79,22 @@ def main():
             if not bars_1s or not bars_5s:
                 print(f"[SKIP] Insufficient data for {symbol} on {args.date} (1s: {len(bars_1s)}, 5s: {len(bars_5s)})")
                 continue
-                
-            print(f"[RUN] Simulating {symbol} with {len(bars_1s)} 1s-bars and {len(bars_5s)} 5s-bars...")
-            trades, final_capital = run_backtest(symbol, bars_1s, bars_5s)
-            
-            if not trades:
-                print(f"[RESULT] {symbol}: No trades triggered.")
-            else:
-                print(f"\n[TRADES] {symbol}:")
-                print(f"{'ENTRY TIME':<20} | {'EXIT TIME':<20} | {'SHARES':<7} | {'ENTRY':<8} | {'EXIT':<8} | {'GROSS $':<9} | {'COMM $':<8} | {'NET $':<9} | {'NET %':<8} | {'REASON'}")
-                print("-" * 130)
-                for t in trades:
-                    e_time = t['entry_time'].strftime("%H:%M:%S")
-                    x_time = t['exit_time'].strftime("%H:%M:%S")
-                    print(f"{e_time:<20} | {x_time:<20} | {t['shares']:<7} | {t['entry_price']:<8.2f} | {t['exit_price']:<8.2f} | {t['gross_pnl']:<9.2f} | {t['commission']:<8.2f} | {t['pnl']:<9.2f} | {t['pnl_pct']:<7.2f}% | {t['reason']}")
-                
-                total_gross_pnl = sum(t['gross_pnl'] for t in trades)
-                total_commission = sum(t['commission'] for t in trades)
-                total_net_pnl = sum(t['pnl'] for t in trades)
-                total_investment = sum(t['investment'] for t in trades)
-                avg_pnl_pct = (total_net_pnl / total_investment * 100) if total_investment > 0 else 0
-                print(f"\n[SUMMARY] {symbol} Gross PnL: ${total_gross_pnl:.2f} | Commission: ${total_commission:.2f} | Net PnL: ${total_net_pnl:.2f} ({avg_pnl_pct:+.2f}%) | Final Capital: ${final_capital:.2f}\n")
-
+            datasets.append((symbol, bars_1s, bars_5s))
     finally:
         tws_app.disconnect()
-        print("[INFO] Backtest complete.")
+
+    if datasets:
+        workers = args.workers or min(len(datasets), os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = []
+            for symbol, bars_1s, bars_5s in datasets:
+                print(f"[RUN] Simulating {symbol} with {len(bars_1s)} 1s-bars and {len(bars_5s)} 5s-bars...")
+                futures.append((symbol, pool.submit(run_backtest, symbol, bars_1s, bars_5s)))
+            for symbol, future in futures:
+                trades, final_capital = future.result()
+                print_results(symbol, trades, final_capital)
+
+    print("[INFO] Backtest complete.")
 
 if __name__ == "__main__":
     main()
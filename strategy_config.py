@@ -73,7 +73,8 @@ ARM_TIMEOUT_SECONDS = 300.0
 # =============================================================================
 INVESTMENT_PER_TRADE = 100.0
 ACCOUNT_NUMBER = "DUO200259"     # Replace with actual IBKR account
-WATCHLIST = ["UOKA", "TNON", "IOBT", "WNW", "EDHL"]
+WATCHLIST = ("UOKA", "TNON", "IOBT", "WNW", "EDHL")
+TRADE_HISTORY_CAP = 10000       # Completed trades kept in memory by the execution engine
 
 # =============================================================================
 # COMMISSION STRUCTURE (IBKR)
@@ -86,6 +87,7 @@ COMMISSION_PERCENT_LOW = 0.005
 # BACKTEST DATA SETTINGS
 # =============================================================================
 BACKTEST_1S_WHAT_TO_SHOW = "TRADES"
+BACKTEST_CACHE_DIR = "cache"    # Raw bars of past dates are reused from here (None disables)
 
 # =============================================================================
 # DEBUG SETTINGS
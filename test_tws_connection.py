@@ -2,9 +2,15 @@
 Quick TWS Connection Diagnostic Tool
 Tests common TWS/IB Gateway ports
 """
+import selectors
 import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
 from tws_data_fetcher import create_tws_data_app
 
+# Diagnostics run against the local TWS/Gateway
+HOST = "127.0.0.1"
+
 # Common IBKR API ports
 PORTS_TO_TEST = {
     7497: "TWS Paper Trading",
@@ -13,26 +19,67 @@ PORTS_TO_TEST = {
     4001: "IB Gateway Live Trading"
 }
 
+def probe_ports(host, ports, timeout=1.0):
+    """Start non-blocking connects to all ports at once; return the set that accepted."""
+    sel = selectors.DefaultSelector()
+    open_set = set()
+    for port in ports:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setblocking(False)
+        err = sock.connect_ex((host, port))
+        if err == 0:
+            open_set.add(port)
+            sock.close()
+        else:
+            # EINPROGRESS/EWOULDBLOCK: writable once the handshake succeeds or fails
+            sel.register(sock, selectors.EVENT_WRITE, port)
+    deadline = time.monotonic() + timeout
+    while sel.get_map():
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        for key, _ in sel.select(remaining):
+            sock = key.fileobj
+            if sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR) == 0:
+                open_set.add(key.data)
+            sel.unregister(sock)
+            sock.close()
+    # Whatever is still pending timed out
+    for key in list(sel.get_map().values()):
+        sel.unregister(key.fileobj)
+        key.fileobj.close()
+    sel.close()
+    return open_set
+
 print("="*60)
 print("TWS/IB Gateway Connection Diagnostic")
 print("="*60)
 
-# Step 1: Check if ports are listening
-print("\n1. Checking which ports are open...")
-open_ports = []
-for port, desc in PORTS_TO_TEST.items():
-    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    sock.settimeout(1)
-    result = sock.connect_ex(('127.0.0.1', port))
-    sock.close()
-    
-    if result == 0:
+# Probe all ports concurrently (one timeout in total), then run the API handshakes
+# on every open port at once so a stalled one does not hold up the others
+print("\n1. Checking open ports and API connection...")
+reachable = probe_ports(HOST, PORTS_TO_TEST)
+connected_port = None
+with ThreadPoolExecutor(max_workers=max(1, len(reachable))) as pool:
+    attempts = {port: pool.submit(create_tws_data_app, host=HOST, port=port, client_id=999)
+                for port in reachable}
+    for port, desc in PORTS_TO_TEST.items():
+        if port not in attempts:
+            print(f"   ✗ Port {port} is CLOSED ({desc})")
+            continue
         print(f"   ✓ Port {port} is OPEN ({desc})")
-        open_ports.append(port)
-    else:
-        print(f"   ✗ Port {port} is CLOSED ({desc})")
+        app = attempts[port].result()
+        if app:
+            print(f"   ✓ Successfully connected on port {port}!")
+            app.disconnect()
+            if connected_port is None:
+                connected_port = port
+        else:
+            print(f"   ✗ Connection failed on port {port}")
+if connected_port is not None:
+    print(f"\n✅ Use port {connected_port} in your script")
 
-if not open_ports:
+if not reachable:
     print("\n❌ NO PORTS ARE OPEN!")
     print("\nPossible issues:")
     print("  - TWS or IB Gateway is not running")
@@ -45,19 +92,7 @@ if not open_ports:
     print("  5. Click OK and restart TWS")
     exit(1)
 
-# Step 2: Try to connect to open ports
-print(f"\n2. Testing API connection on open ports...")
-for port in open_ports:
-    print(f"\n   Testing {port} ({PORTS_TO_TEST[port]})...")
-    app = create_tws_data_app(host="127.0.0.1", port=port, client_id=999)
-    if app:
-        print(f"   ✓ Successfully connected on port {port}!")
-        print(f"\n✅ Use port {port} in your script")
-        app.disconnect()
-        break
-    else:
-        print(f"   ✗ Connection failed on port {port}")
-else:
+if connected_port is None:
     print("\n❌ Could not connect to any open port")
     print("\nPossible issues:")
     print("  - Client ID 999 might not be whitelisted")
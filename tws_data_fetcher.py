@@ -7,11 +7,15 @@ from ibapi.wrapper import EWrapper
 from ibapi.contract import Contract
 from ibapi.common import TickerId, TickAttrib, BarData
 from ibapi.ticktype import TickTypeEnum
-from datetime import datetime, timedelta
-from typing import List, Dict, Callable, Optional
-from collections import deque
+from datetime import date, datetime, timedelta
+from typing import List, Dict, Callable, Optional, Tuple
+from collections import deque, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+import queue
 import threading
 import time
+import numpy as np
 
 
 def tick_type_str(tickType):
@@ -31,39 +35,116 @@ def tick_type_str(tickType):
         return str(tickType)
 
 
+# Informational codes that don't affect functionality (not printed)
+_SUPPRESSED_CODES = frozenset({
+    2104, 2106, 2107, 2119, 2158,  # Market data / HMDS / sec-def farm connection messages
+    2176,  # Fractional share warning
+})
+# Warnings below 500 that are still worth printing
+_IMPORTANT_CODES = frozenset({1100, 1101, 1102, 1300, 201, 162})
+
+@dataclass(slots=True)
+class RealtimeQuote:
+    """Latest quote and VWAP state of one subscribed symbol, updated by ticks."""
+    price: float = 0.0
+    bid: float = 0.0
+    ask: float = 0.0
+    last_size: int = 0
+    bid_size: int = 0
+    ask_size: int = 0
+    volume: int = 0
+    vwap: float = 0.0
+    syncing: bool = False
+    has_rt_vwap: bool = False
+    # Fallback VWAP accumulators, used until TWS sends RT_VWAP
+    cumulative_pv: float = 0.0
+    cumulative_volume: float = 0.0
+    last_daily_volume: float = 0
+
+# Historical bar columns, in the key order of the per-bar dicts
+_HIST_FIELDS = ('date', 'open', 'high', 'low', 'close', 'volume', 'average', 'barCount')
+
+def _empty_columns() -> Dict[str, list]:
+    return {name: [] for name in _HIST_FIELDS}
+
+# tickType code -> RealtimeQuote attribute, resolved once by name for the installed ibapi
+_PRICE_TICK_NAMES = {'LAST': 'price', 'BID': 'bid', 'ASK': 'ask', 'RT_VWAP': 'vwap'}
+_SIZE_TICK_NAMES = {'LAST_SIZE': 'last_size', 'BID_SIZE': 'bid_size', 'ASK_SIZE': 'ask_size', 'VOLUME': 'volume'}
+_PRICE_FIELDS = {}
+_SIZE_FIELDS = {}
+for _code in range(256):
+    _name = tick_type_str(_code)
+    if _name in _PRICE_TICK_NAMES:
+        _PRICE_FIELDS[_code] = _PRICE_TICK_NAMES[_name]
+    elif _name in _SIZE_TICK_NAMES:
+        _SIZE_FIELDS[_code] = _SIZE_TICK_NAMES[_name]
+
+
 class TWSDataApp(EClient, EWrapper):
     """
     TWS Application for fetching historical and real-time market data.
     Enhanced for alert scanner with VWAP calculation.
     """
     
-    def __init__(self):
+    def __init__(self, flush_interval_ms: int = 0):
         EClient.__init__(self, self)
         self.next_order_id = None
         self.req_id_counter = 2000
         self.connected = False
+        self.connected_event = threading.Event()  # set by nextValidId
         self.lock = threading.Lock()
         
         # Historical data storage
-        self.historical_data = {}  # reqId -> list of bars
-        self.historical_complete = {}  # reqId -> bool
+        self.historical_data = {}  # reqId -> column name -> list of values
+        self.historical_complete = {}  # reqId -> threading.Event, set by historicalDataEnd
+        self._vwap_attr = None  # BarData VWAP attribute name ('' if none), set by the first bar
         
         # Real-time data storage
         self.realtime_callbacks = {}  # reqId -> (symbol, callback)
-        self.realtime_data = {}  # symbol -> {price, bid, ask, last_size, bid_size, ask_size, volume, vwap}
-        self.contracts = {}  # symbol -> Contract
+        self.symbol_to_reqid = {}  # symbol -> reqId of its market data subscription
+        # Start-of-day VWAP syncs share a few threads, which also caps concurrent history requests;
+        # created on first use and again after a disconnect dropped it
+        self._sync_pool: Optional[ThreadPoolExecutor] = None
+        self.realtime_data: Dict[str, RealtimeQuote] = {}
+        self.contracts = {}  # symbol -> Contract, shared by every request for that symbol
+        self.synced_today: Dict[str, date] = {}  # symbol -> day its realtime_data entry was VWAP-synced
+        
+        # Tick batching: with an interval, only each symbol's latest update is delivered,
+        # once per interval, from a flusher thread; 0 delivers every tick inline
+        self.flush_interval_ms = flush_interval_ms
+        self._pending = {}  # symbol -> (callback, (price, volume, vwap, bid, ask))
+        if flush_interval_ms > 0:
+            threading.Thread(target=self._flush_loop, daemon=True).start()
         
         # Order tracking
         self.order_status_callbacks = [] # List of callbacks for order updates
+        self.error_handlers = defaultdict(list) # errorCode -> callbacks(reqId, errorCode, errorString)
+        
+        # error() only enqueues; a writer thread owns the tws_errors.log handle
+        self._err_queue = queue.SimpleQueue()
+        threading.Thread(target=self._drain_errors, daemon=True).start()
         
         # Fundamental data storage
-        self.fundamental_data = {} # symbol -> XML string
-        self.fundamental_events = {} # symbol -> threading.Event
+        self.fundamental_data = {} # reqId -> XML string
+        self.fundamental_events = {} # reqId -> threading.Event; both are accessed without self.lock
         
+    def disconnect(self):
+        """Drop queued VWAP syncs, close the TWS connection and flush the error log."""
+        # EClient.run also calls this when the socket drops, so the pool is released, not
+        # disabled: the next subscribe after a reconnect starts a fresh one
+        with self.lock:
+            pool, self._sync_pool = self._sync_pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+        super().disconnect()
+        # The writer is a daemon thread: records still queued at interpreter exit would be lost
+        self._flush_errors()
+
     def nextValidId(self, orderId: int):
         """Called when connection is established"""
         self.next_order_id = orderId
         self.connected = True
+        self.connected_event.set()
         print(f"[TWS] Connected. Next valid order ID: {orderId}")
 
     def orderStatus(self, orderId, status, filled, remaining, avgFillPrice, permId, parentId, lastFillPrice, clientId, whyHeld, mktCapPrice):
@@ -81,32 +162,34 @@ class TWSDataApp(EClient, EWrapper):
 
     def fundamentalData(self, reqId: int, data: str):
         """Receive fundamental data XML"""
-        with self.lock:
-            self.fundamental_data[reqId] = data
-            if reqId in self.fundamental_events:
-                self.fundamental_events[reqId].set()
+        # Single dict operations are atomic; store the data before waking the waiter
+        self.fundamental_data[reqId] = data
+        event = self.fundamental_events.get(reqId)
+        if event is not None:
+            event.set()
         
     def error(self, reqId: int, errorCode: int, errorString: str, advancedOrderRejectJson="", *args):
         """Error handler - accepts variable arguments for compatibility across ibapi versions"""
         
-        # Log all errors and warnings to a file for debugging
-        with open("tws_errors.log", "a") as f:
-            f.write(f"{datetime.now()}: ReqId={reqId}, Code={errorCode}, Msg={errorString}\n")
+        # Log all errors and warnings to a file for debugging (written by _drain_errors)
+        self._err_queue.put((datetime.now(), reqId, errorCode, errorString))
+
+        # Only subscribers to this specific code are called; this runs on the reader thread,
+        # so a failing handler must not escape and stop the message loop
+        for handler in self.error_handlers.get(errorCode, ()):
+            try:
+                handler(reqId, errorCode, errorString)
+            except Exception as e:
+                print(f"[TWS] Error handler failed for code {errorCode} (reqId {reqId}): {e}")
 
         # Suppress common info/warning messages that don't affect functionality
-        suppressed_codes = [
-            2104, 2106, 2107, 2119, 2158,  # Market data farm connection messages
-            2106,  # HMDS data farm connection
-            2158,  # Sec-def data farm connection
-            2176,  # Fractional share warning
-        ]
-        if errorCode in suppressed_codes:
+        if errorCode in _SUPPRESSED_CODES:
             return
         if errorCode == 10167:  # Displaying delayed market data
             print(f"[TWS] Using delayed market data (live subscription may be needed)")
             return
         # Only show actual errors (code >= 500) or important warnings
-        if errorCode >= 500 or errorCode in [1100, 1101, 1102, 1300, 201, 162]:
+        if errorCode >= 500 or errorCode in _IMPORTANT_CODES:
             # Try to find the symbol associated with this reqId
             symbol_info = ""
             with self.lock:
@@ -114,146 +197,169 @@ class TWSDataApp(EClient, EWrapper):
                     symbol_info = f" ({self.realtime_callbacks[reqId][0]})"
             print(f"[TWS Error] ReqId: {reqId}{symbol_info}, Code: {errorCode}, Msg: {errorString}")
         
+    def _drain_errors(self):
+        """Append queued error records to tws_errors.log, one write per burst."""
+        q = self._err_queue
+        f = None
+        while True:
+            items = [q.get()]
+            while True:
+                try:
+                    items.append(q.get_nowait())
+                except queue.Empty:
+                    break
+            # Events are flush barriers from _flush_errors, set once everything before them is on disk
+            barriers = [x for x in items if isinstance(x, threading.Event)]
+            records = [x for x in items if not isinstance(x, threading.Event)] if barriers else items
+            if records:
+                if f is None:
+                    f = open("tws_errors.log", "a")
+                f.write("".join(f"{ts}: ReqId={reqId}, Code={code}, Msg={msg}\n" for ts, reqId, code, msg in records))
+                f.flush()
+            for barrier in barriers:
+                barrier.set()
+
+    def _flush_errors(self, timeout: float = 2.0):
+        """Wait until the error records queued so far have been written to tws_errors.log."""
+        done = threading.Event()
+        self._err_queue.put(done)
+        done.wait(timeout)
+        
     def historicalData(self, reqId: int, bar: BarData):
         """Receive historical bar data"""
         with self.lock:
-            if reqId not in self.historical_data:
-                self.historical_data[reqId] = []
+            cols = self.historical_data.get(reqId)
+            if cols is None:
+                cols = self.historical_data[reqId] = _empty_columns()
             
-            # Get VWAP - attribute name varies by ibapi version
-            vwap = 0.0
-            if hasattr(bar, 'average'):
-                vwap = bar.average
-            elif hasattr(bar, 'wap'):
-                vwap = bar.wap
+            # Get VWAP - attribute name varies by ibapi version, so it is resolved on the first bar
+            attr = self._vwap_attr
+            if attr is None:
+                attr = 'average' if hasattr(bar, 'average') else ('wap' if hasattr(bar, 'wap') else '')
+                self._vwap_attr = attr
+            if attr:
+                vwap = getattr(bar, attr)
             else:
                 # Fallback: calculate simple average of high and low
                 vwap = (bar.high + bar.low) / 2.0
             
-            self.historical_data[reqId].append({
-                'date': bar.date,
-                'open': bar.open,
-                'high': bar.high,
-                'low': bar.low,
-                'close': bar.close,
-                'volume': bar.volume,
-                'average': vwap,  # VWAP
-                'barCount': bar.barCount
-            })
+            cols['date'].append(bar.date)
+            cols['open'].append(bar.open)
+            cols['high'].append(bar.high)
+            cols['low'].append(bar.low)
+            cols['close'].append(bar.close)
+            cols['volume'].append(bar.volume)
+            cols['average'].append(vwap)  # VWAP
+            cols['barCount'].append(bar.barCount)
     
     def historicalDataEnd(self, reqId: int, start: str, end: str):
         """Called when historical data is complete"""
         with self.lock:
-            self.historical_complete[reqId] = True
+            done = self.historical_complete.get(reqId)
+        if done is not None:
+            done.set()
         print(f"[TWS] Historical data complete for reqId {reqId}")
     
     def tickPrice(self, reqId: TickerId, tickType: int, price: float, attrib: TickAttrib):
         """Handle price ticks"""
+        field = _PRICE_FIELDS.get(tickType)
+        # One critical section per tick; the callback runs after the lock is released
         with self.lock:
-            if reqId not in self.realtime_callbacks:
+            entry = self.realtime_callbacks.get(reqId)
+            if entry is None:
                 return
-            symbol, callback = self.realtime_callbacks[reqId]
+            symbol, callback = entry
             
-            if symbol not in self.realtime_data:
-                self.realtime_data[symbol] = {
-                    'price': 0.0, 'bid': 0.0, 'ask': 0.0,
-                    'last_size': 0, 'bid_size': 0, 'ask_size': 0,
-                    'volume': 0, 'vwap': 0.0, 'syncing': False
-                }
-            
-        tt = tick_type_str(tickType)
-        
-        trigger = False
-        if tt == 'LAST':
-            with self.lock:
-                self.realtime_data[symbol]['price'] = price
-            trigger = True
-        elif tt == 'BID':
-            with self.lock:
-                self.realtime_data[symbol]['bid'] = price
-            trigger = True
-        elif tt == 'ASK':
-            with self.lock:
-                self.realtime_data[symbol]['ask'] = price
-            trigger = True
-        elif tt == 'RT_VWAP':
-            with self.lock:
-                self.realtime_data[symbol]['vwap'] = price
-            trigger = True
+            rt = self.realtime_data.get(symbol)
+            if rt is None:
+                rt = self.realtime_data[symbol] = RealtimeQuote()
+            if field is None:
+                return
+            setattr(rt, field, price)
+            if field == 'vwap':
+                rt.has_rt_vwap = True # TWS supplies VWAP; tickSize skips its fallback from now on
+            price, vwap, bid, ask, volume = rt.price, rt.vwap, rt.bid, rt.ask, rt.volume
+            if self.flush_interval_ms > 0:
+                if price > 0:
+                    self._pending[symbol] = (callback, (price, volume, vwap, bid, ask))
+                return
             
-        if trigger:
-            with self.lock:
-                price = self.realtime_data[symbol]['price']
-                vwap = self.realtime_data[symbol]['vwap']
-                bid = self.realtime_data[symbol]['bid']
-                ask = self.realtime_data[symbol]['ask']
-                volume = self.realtime_data[symbol]['volume']
-            if price > 0:
-                callback(symbol, price, volume, vwap, datetime.now(), bid, ask)
+        if price > 0:
+            callback(symbol, price, volume, vwap, datetime.now(), bid, ask)
     
     def tickSize(self, reqId: TickerId, tickType: int, size: int):
         """Handle size ticks"""
+        field = _SIZE_FIELDS.get(tickType)
+        # One critical section per tick; the callback runs after the lock is released
         with self.lock:
-            if reqId not in self.realtime_callbacks:
+            entry = self.realtime_callbacks.get(reqId)
+            if entry is None:
                 return
-            symbol, callback = self.realtime_callbacks[reqId]
+            symbol, callback = entry
             
-            if symbol not in self.realtime_data:
-                self.realtime_data[symbol] = {
-                    'price': 0.0, 'bid': 0.0, 'ask': 0.0,
-                    'last_size': 0, 'bid_size': 0, 'ask_size': 0,
-                    'volume': 0, 'vwap': 0.0, 'syncing': False
-                }
-        
-        tt = tick_type_str(tickType)
-        
-        trigger = False
-        if tt == 'LAST_SIZE':
-            with self.lock:
-                self.realtime_data[symbol]['last_size'] = size
-            trigger = True
-        elif tt == 'BID_SIZE':
-            with self.lock:
-                self.realtime_data[symbol]['bid_size'] = size
-            trigger = True
-        elif tt == 'ASK_SIZE':
-            with self.lock:
-                self.realtime_data[symbol]['ask_size'] = size
-            trigger = True
-        elif tt == 'VOLUME':
-            with self.lock:
-                self.realtime_data[symbol]['volume'] = size
-                
+            rt = self.realtime_data.get(symbol)
+            if rt is None:
+                rt = self.realtime_data[symbol] = RealtimeQuote()
+            if field is None:
+                return
+            setattr(rt, field, size)
+            
+            if field == 'volume' and not rt.has_rt_vwap:
                 # If TWS hasn't provided RT_VWAP yet, calculate our own as fallback
-                price = self.realtime_data[symbol]['price']
-                if price > 0 and self.realtime_data[symbol]['vwap'] == 0:
-                    if 'cumulative_pv' not in self.realtime_data[symbol]:
-                        self.realtime_data[symbol]['cumulative_pv'] = 0.0
-                        self.realtime_data[symbol]['cumulative_volume'] = 0.0
-                    
+                price = rt.price
+                if price > 0 and rt.vwap == 0:
                     current_daily_volume = size
-                    last_daily_volume = self.realtime_data[symbol].get('last_daily_volume', 0)
-                    volume_increment = current_daily_volume - last_daily_volume
+                    volume_increment = current_daily_volume - rt.last_daily_volume
                     
                     if volume_increment > 0:
-                        self.realtime_data[symbol]['cumulative_pv'] += price * volume_increment
-                        self.realtime_data[symbol]['cumulative_volume'] += volume_increment
-                        self.realtime_data[symbol]['last_daily_volume'] = current_daily_volume
+                        rt.cumulative_pv += price * volume_increment
+                        rt.cumulative_volume += volume_increment
+                        rt.last_daily_volume = current_daily_volume
                     
-                    if self.realtime_data[symbol]['cumulative_volume'] > 0:
-                        self.realtime_data[symbol]['vwap'] = self.realtime_data[symbol]['cumulative_pv'] / self.realtime_data[symbol]['cumulative_volume']
-            trigger = True
+                    if rt.cumulative_volume > 0:
+                        rt.vwap = rt.cumulative_pv / rt.cumulative_volume
             
-        if trigger:
-            with self.lock:
-                price = self.realtime_data[symbol]['price']
-                vwap = self.realtime_data[symbol]['vwap']
-                bid = self.realtime_data[symbol]['bid']
-                ask = self.realtime_data[symbol]['ask']
-                volume = self.realtime_data[symbol]['volume']
-            if price > 0:
-                callback(symbol, price, volume, vwap, datetime.now(), bid, ask)
+            price, vwap, bid, ask, volume = rt.price, rt.vwap, rt.bid, rt.ask, rt.volume
+            if self.flush_interval_ms > 0:
+                if price > 0:
+                    self._pending[symbol] = (callback, (price, volume, vwap, bid, ask))
+                return
+            
+        if price > 0:
+            callback(symbol, price, volume, vwap, datetime.now(), bid, ask)
     
+    def _flush_loop(self):
+        interval = self.flush_interval_ms / 1000.0
+        while True:
+            time.sleep(interval)
+            self._flush_pending()
+
+    def _flush_pending(self):
+        """Deliver the latest pending update of each symbol to its callback."""
+        with self.lock:
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, {}
+        # One timestamp for the whole batch
+        now = datetime.now()
+        for symbol, (callback, (price, volume, vwap, bid, ask)) in pending.items():
+            try:
+                callback(symbol, price, volume, vwap, now, bid, ask)
+            except Exception as e:
+                print(f"[TWS] Tick callback error for {symbol}: {e}")
+
+    def _get_contract(self, symbol: str) -> Contract:
+        """Return the cached SMART/USD stock contract for symbol, building it on first use."""
+        contract = self.contracts.get(symbol)
+        if contract is None:
+            contract = Contract()
+            contract.symbol = symbol
+            contract.secType = "STK"
+            contract.exchange = "SMART"
+            contract.currency = "USD"
+            self.contracts[symbol] = contract
+        return contract
+
     def get_next_req_id(self):
         """Get next request ID"""
         with self.lock:
@@ -269,17 +375,41 @@ class TWSDataApp(EClient, EWrapper):
         bar_size: str = "1 min",
         what_to_show: str = "TRADES"
     ) -> List[Dict]:
-        """Fetch historical bar data from TWS."""
-        contract = Contract()
-        contract.symbol = symbol
-        contract.secType = "STK"
-        contract.exchange = "SMART"
-        contract.currency = "USD"
+        """Fetch historical bar data from TWS as one dict per bar."""
+        return self.fetch_historical_bars_checked(symbol, end_date, duration, bar_size, what_to_show)[0]
+
+    def fetch_historical_bars_checked(
+        self,
+        symbol: str,
+        end_date: datetime,
+        duration: str = "1 D",
+        bar_size: str = "1 min",
+        what_to_show: str = "TRADES"
+    ) -> Tuple[List[Dict], bool]:
+        """Like fetch_historical_bars, plus whether TWS sent historicalDataEnd (False: timed out, bars may be cut off)."""
+        cols, complete = self._request_historical(symbol, end_date, duration, bar_size, what_to_show)
+        return [dict(zip(_HIST_FIELDS, row)) for row in zip(*cols.values())], complete
+
+    def fetch_historical_columns(
+        self,
+        symbol: str,
+        end_date: datetime,
+        duration: str = "1 D",
+        bar_size: str = "1 min",
+        what_to_show: str = "TRADES"
+    ) -> Dict[str, list]:
+        """Fetch historical bar data from TWS as column lists keyed by field name."""
+        return self._request_historical(symbol, end_date, duration, bar_size, what_to_show)[0]
+
+    def _request_historical(self, symbol, end_date, duration, bar_size, what_to_show) -> Tuple[Dict[str, list], bool]:
+        """Run one reqHistoricalData; return the columns and whether historicalDataEnd arrived."""
+        contract = self._get_contract(symbol)
         
         req_id = self.get_next_req_id()
+        done = threading.Event()
         with self.lock:
-            self.historical_data[req_id] = []
-            self.historical_complete[req_id] = False
+            self.historical_data[req_id] = _empty_columns()
+            self.historical_complete[req_id] = done
         
         end_date_str = end_date.strftime("%Y%m%d %H:%M:%S") + " US/Eastern"
         self.reqHistoricalData(
@@ -295,88 +425,77 @@ class TWSDataApp(EClient, EWrapper):
             chartOptions=[]
         )
         
-        timeout = 30.0
-        waited = 0.0
-        while waited < timeout:
-            with self.lock:
-                if self.historical_complete.get(req_id, False):
-                    break
-            time.sleep(0.1)
-            waited += 0.1
+        complete = done.wait(timeout=30.0)
         
         with self.lock:
-            bars = self.historical_data.get(req_id, [])
-            if req_id in self.historical_data: del self.historical_data[req_id]
-            if req_id in self.historical_complete: del self.historical_complete[req_id]
-        return bars
+            cols = self.historical_data.pop(req_id, None) or _empty_columns()
+            self.historical_complete.pop(req_id, None)
+        return cols, complete
 
     def sync_vwap_from_start_of_day(self, symbol: str):
         """
         Synchronize VWAP by fetching all intraday bars since pre-market start.
         This ensures our calculated VWAP matches charts like Webull.
         """
+        today = date.today()
+        with self.lock:
+            # The live entry already holds today's history; re-fetching it only costs pacing
+            if self.synced_today.get(symbol) == today and symbol in self.realtime_data:
+                return
         print(f"[TWS] Synchronizing historical VWAP for {symbol}...")
         with self.lock:
-            if symbol not in self.realtime_data:
-                self.realtime_data[symbol] = {'price': 0.0, 'vwap': 0.0, 'syncing': True}
-            else:
-                self.realtime_data[symbol]['syncing'] = True
+            rt = self.realtime_data.get(symbol)
+            if rt is None:
+                rt = self.realtime_data[symbol] = RealtimeQuote()
+            rt.syncing = True
 
         # Fetch 1-minute bars for the current day
         # We use a 1-day duration which will give us all bars for the current session including pre-market
-        bars = self.fetch_historical_bars(symbol, datetime.now(), duration="1 D", bar_size="1 min")
+        cols = self.fetch_historical_columns(symbol, datetime.now(), duration="1 D", bar_size="1 min")
         
-        if not bars:
+        if not cols['date']:
             print(f"[TWS] No historical bars found for {symbol}. VWAP will start from current price.")
             with self.lock:
-                self.realtime_data[symbol]['syncing'] = False
+                rt.syncing = False
             return
 
-        total_pv = 0.0
-        total_volume = 0.0
-        
-        for bar in bars:
-            # bar['average'] is the WAP (Weighted Average Price) for that bar
-            # bar['volume'] is the volume for that bar
-            total_pv += bar['average'] * bar['volume']
-            total_volume += bar['volume']
+        # Each bar's 'average' is its WAP (Weighted Average Price), weighted by its 'volume'
+        avgs = np.asarray(cols['average'], dtype=np.float64)
+        vols = np.asarray(cols['volume'], dtype=np.float64)
+        total_pv = float(np.dot(avgs, vols))
+        total_volume = float(vols.sum())
             
         if total_volume > 0:
             vwap = total_pv / total_volume
             with self.lock:
-                self.realtime_data[symbol]['vwap'] = vwap
-                self.realtime_data[symbol]['cumulative_pv'] = total_pv
-                self.realtime_data[symbol]['cumulative_volume'] = total_volume
-                self.realtime_data[symbol]['last_daily_volume'] = total_volume # Approximation
-                self.realtime_data[symbol]['syncing'] = False
+                rt.vwap = vwap
+                rt.cumulative_pv = total_pv
+                rt.cumulative_volume = total_volume
+                rt.last_daily_volume = total_volume # Approximation
+                rt.syncing = False
+                self.synced_today[symbol] = today
             print(f"[TWS] {symbol} synced. Historical VWAP: ${vwap:.2f} (Volume: {total_volume:,.0f})")
         else:
             with self.lock:
-                self.realtime_data[symbol]['syncing'] = False
+                rt.syncing = False
 
     def subscribe_market_data(self, symbol: str, callback: Callable):
         """Subscribe to real-time market data."""
-        # First, sync historical VWAP in a separate thread to not block
-        threading.Thread(target=self.sync_vwap_from_start_of_day, args=(symbol,), daemon=True).start()
-
-        contract = Contract()
-        contract.symbol = symbol
-        contract.secType = "STK"
-        contract.exchange = "SMART"
-        contract.currency = "USD"
-        
+        # First, sync historical VWAP on the pool to not block
         with self.lock:
-            self.contracts[symbol] = contract
+            if self._sync_pool is None:
+                self._sync_pool = ThreadPoolExecutor(max_workers=10, thread_name_prefix="vwap-sync")
+            pool = self._sync_pool
+        pool.submit(self.sync_vwap_from_start_of_day, symbol)
+
+        contract = self._get_contract(symbol)
         
         req_id = self.get_next_req_id()
         with self.lock:
             self.realtime_callbacks[req_id] = (symbol, callback)
+            self.symbol_to_reqid[symbol] = req_id
             if symbol not in self.realtime_data:
-                self.realtime_data[symbol] = {
-                    'price': 0.0, 'bid': 0.0, 'ask': 0.0,
-                    'last_size': 0, 'bid_size': 0, 'ask_size': 0,
-                    'volume': 0, 'vwap': 0.0, 'syncing': True
-                }
+                self.realtime_data[symbol] = RealtimeQuote(syncing=True)
         
         # Use market data type 1 (live) or 3 (delayed) depending on your subscription
         self.reqMarketDataType(3) # Use delayed data if live is not available
@@ -393,49 +512,34 @@ class TWSDataApp(EClient, EWrapper):
     
     def unsubscribe_realtime_data(self, symbol: str):
         """Unsubscribe from real-time market data"""
-        req_id_to_cancel = None
         with self.lock:
-            for req_id, (sym, _) in self.realtime_callbacks.items():
-                if sym == symbol:
-                    req_id_to_cancel = req_id
-                    break
+            req_id_to_cancel = self.symbol_to_reqid.pop(symbol, None)
         
         if req_id_to_cancel:
             self.cancelMktData(req_id_to_cancel)
             with self.lock:
                 if req_id_to_cancel in self.realtime_callbacks: del self.realtime_callbacks[req_id_to_cancel]
                 if symbol in self.realtime_data: del self.realtime_data[symbol]
+                self.synced_today.pop(symbol, None)
             print(f"[TWS] Unsubscribed from {symbol}")
 
     def fetch_fundamental_data(self, symbol: str, report_type: str = "ReportSnapshot") -> Optional[str]:
         """Fetch fundamental data XML for a symbol"""
-        contract = Contract()
-        contract.symbol = symbol
-        contract.secType = "STK"
-        contract.exchange = "SMART"
-        contract.currency = "USD"
+        contract = self._get_contract(symbol)
         
         req_id = self.get_next_req_id()
         event = threading.Event()
-        with self.lock:
-            self.fundamental_events[req_id] = event
+        self.fundamental_events[req_id] = event
             
         self.reqFundamentalData(req_id, contract, report_type, [])
-        if event.wait(timeout=10.0):
-            with self.lock:
-                data = self.fundamental_data.get(req_id)
-                del self.fundamental_data[req_id]
-                del self.fundamental_events[req_id]
-                return data
-        else:
-            with self.lock:
-                if req_id in self.fundamental_events: del self.fundamental_events[req_id]
-            return None
+        event.wait(timeout=10.0)
+        self.fundamental_events.pop(req_id, None)
+        return self.fundamental_data.pop(req_id, None)
 
 
-def create_tws_data_app(host="127.0.0.1", port=7497, client_id=2) -> Optional[TWSDataApp]:
+def create_tws_data_app(host="127.0.0.1", port=7497, client_id=2, flush_interval_ms: int = 0) -> Optional[TWSDataApp]:
     """Create and connect a TWS data application."""
-    app = TWSDataApp()
+    app = TWSDataApp(flush_interval_ms=flush_interval_ms)
     print(f"[TWS] Attempting connection to {host}:{port} (client_id={client_id})...")
     try:
         app.connect(host, port, client_id)
@@ -452,12 +556,14 @@ def create_tws_data_app(host="127.0.0.1", port=7497, client_id=2) -> Optional[TW
     api_thread.start()
     
     timeout = 10.0
-    waited = 0.0
     print(f"[TWS] Waiting for connection handshake...", end="", flush=True)
-    while not app.connected and waited < timeout:
-        time.sleep(0.1)
-        waited += 0.1
-        if int(waited * 10) % 10 == 0:
+    # Returns as soon as nextValidId arrives; a dot per second while waiting
+    deadline = time.monotonic() + timeout
+    while not app.connected_event.is_set():
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        if not app.connected_event.wait(min(1.0, remaining)):
             print(".", end="", flush=True)
     print()
     